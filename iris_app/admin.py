@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import IrisPlant, Laboratory
+from .models import ImportJob, IrisPlant, Laboratory
+from .signals import batched_summary_updates
 
 
 @admin.register(Laboratory)
@@ -28,9 +29,9 @@ class LaboratoryAdmin(admin.ModelAdmin):
     
     def iris_count(self, obj):
         """Show count of Iris samples in this laboratory"""
-        count = obj.iris_plants.count()
-        return f"{count} samples"
+        return f"{obj.sample_count} samples"
     iris_count.short_description = "Iris Sample Count"
+    iris_count.admin_order_field = 'sample_count'
 
 
 @admin.register(IrisPlant)
@@ -38,7 +39,7 @@ class IrisPlantAdmin(admin.ModelAdmin):
     """Admin View for Iris Plant Model"""
     list_display = ('get_species_display', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'lab', 'created_by', 'created_at')
     list_filter = ('species', 'lab', 'created_by', 'created_at')
-    search_fields = ('species', 'lab__name', 'created_by__username')
+    search_fields = ('species', 'lab__name', 'created_by__username', 'external_id')
     readonly_fields = ('created_by', 'created_at', 'updated_at')
     ordering = ('-created_at',)
     
@@ -51,7 +52,7 @@ class IrisPlantAdmin(admin.ModelAdmin):
             'description': 'All measurements must be in centimeters (cm)'
         }),
         ('Laboratory', {
-            'fields': ('lab',)
+            'fields': ('lab', 'external_id')
         }),
         ('System Information', {
             'fields': ('created_by', 'created_at', 'updated_at'),
@@ -63,4 +64,23 @@ class IrisPlantAdmin(admin.ModelAdmin):
         """Automatically set created_by when creating a new record"""
         if not change:
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk delete with one summary update per laboratory / statistics group"""
+        with batched_summary_updates():
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """Admin View for background CSV import jobs"""
+    list_display = ('file_name', 'status', 'progress', 'rows_imported', 'rows_failed', 'created_by', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('file_name', 'created_by__username')
+    readonly_fields = (
+        'csv_file', 'file_name', 'total_bytes', 'bytes_processed', 'rows_processed',
+        'rows_imported', 'rows_updated', 'rows_unchanged', 'rows_failed', 'errors', 'error_message',
+        'created_by', 'created_at', 'started_at', 'finished_at', 'updated_at'
+    )
+    ordering = ('-created_at',)
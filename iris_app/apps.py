@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class IrisAppConfig(AppConfig):
-    name = 'iris_app'
\ No newline at end of file
+    name = 'iris_app'
+
+    def ready(self):
+        """
+        Connect signal receivers (model summaries, SQLite connection setup)
+        and optionally preload the ML stack (see IRIS_ML_WARMUP in settings)
+        """
+        from . import signals, sqlite  # noqa: F401
+
+        if getattr(settings, 'IRIS_ML_WARMUP', False):
+            from . import model_registry
+            model_registry.warm_up()
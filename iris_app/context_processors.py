@@ -0,0 +1,10 @@
+from .roles import ANONYMOUS_ROLES, get_roles
+
+
+def roles(request):
+    """Expose the (cached) roles of the current user to every template"""
+    user_roles = get_roles(request) if hasattr(request, 'user') else ANONYMOUS_ROLES
+    return {
+        'roles': user_roles,
+        'is_editor': user_roles.is_editor,
+    }
@@ -0,0 +1,14 @@
+"""
+Counters kept in Django's cache (dataset generation, role versions,
+prediction cache hits/misses).
+"""
+
+
+def increment(cache, key, start):
+    """Increment the counter under key, creating it from start if it is missing"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter expired or was never set; add() keeps a value created meanwhile
+        cache.add(key, start, timeout=None)
+        cache.incr(key)
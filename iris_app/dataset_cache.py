@@ -0,0 +1,73 @@
+"""
+Caching of values derived from the whole dataset (statistics, counts).
+
+Every write to IrisPlant or Laboratory bumps a dataset generation
+counter (see signals.py). Cached values are stored under keys that
+include the generation, so a write makes all of them unreachable at
+once and they are recomputed on the next request. Use a shared cache
+backend (IRIS_DATASET_CACHE alias) when running several workers.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import counters, summary
+
+
+GENERATION_KEY = 'iris:dataset:generation'
+
+
+def get_cache():
+    """Return the cache backend used for dataset-derived values"""
+    return caches[getattr(settings, 'IRIS_DATASET_CACHE', 'default')]
+
+
+def get_generation():
+    """Return the current dataset generation"""
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock, so a lost counter never reuses old keys
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """Start a new dataset generation once the current transaction commits"""
+    transaction.on_commit(_increment)
+
+
+def cached(name, compute, timeout=None):
+    """Return compute() for the current generation, computing it at most once"""
+    if timeout is None:
+        timeout = getattr(settings, 'IRIS_DATASET_CACHE_TIMEOUT', 3600)
+    key = f'iris:dataset:{get_generation()}:{name}'
+    return get_cache().get_or_set(key, compute, timeout)
+
+
+def get_statistics():
+    """
+    Return (payload, etag) of the statistics API.
+    The ETag is a hash of the payload, so it stays valid across
+    generations (and cache restarts) as long as the numbers are the same.
+    """
+    return cached('statistics', _compute_statistics)
+
+
+def _compute_statistics():
+    payload = summary.get_statistics()
+    digest = hashlib.sha1(
+        json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+    return payload, f'"{digest}"'
+
+
+def _increment():
+    counters.increment(get_cache(), GENERATION_KEY, time.time_ns())
@@ -0,0 +1,159 @@
+"""
+Columnar exports of the Iris dataset.
+
+- npz: float32 feature matrix + int8 species codes (NumPy only)
+- parquet / arrow: Parquet and Arrow IPC files, available when pyarrow
+  is installed
+
+Rows are read with a server-side iterator and converted to columns one
+batch at a time, so no model instances are built.
+"""
+
+import tempfile
+
+from django.conf import settings
+
+from .models import IrisPlant
+
+
+FEATURE_FIELDS = IrisPlant.MEASUREMENT_FIELDS
+SPECIES_CODES = [code for code, name in IrisPlant.SPECIES_CHOICES]
+
+EXPORT_FORMATS = {
+    'npz': ('application/octet-stream', 'npz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+}
+
+
+class ExportFormatError(Exception):
+    """Raised when an export format is unknown or its dependency is missing"""
+
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_column_batches(batch_size=None):
+    """
+    Yield dicts of NumPy column arrays, batch_size rows at a time:
+    id (int64), features (float32, n x 4), species (int8 codes, -1 if unknown),
+    lab_id (int32, -1 when empty) and created_at (datetime64[us], UTC)
+    """
+    import numpy as np
+
+    batch_size = batch_size or getattr(settings, 'IRIS_EXPORT_CHUNK_SIZE', 2000)
+    species_index = {code: index for index, code in enumerate(SPECIES_CODES)}
+    rows = IrisPlant.objects.order_by('id').values_list(
+        'id', *FEATURE_FIELDS, 'species', 'lab_id', 'created_at'
+    ).iterator(chunk_size=batch_size)
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield _to_columns(np, batch, species_index)
+            batch = []
+    if batch:
+        yield _to_columns(np, batch, species_index)
+
+
+def export_dataset(file_format):
+    """
+    Write the dataset in a columnar format.
+    Returns (file object positioned at 0, content type, file extension).
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ExportFormatError(f'Unknown export format: {file_format}')
+    if file_format != 'npz' and not pyarrow_available():
+        raise ExportFormatError(f'{file_format} export requires pyarrow to be installed.')
+
+    content_type, extension = EXPORT_FORMATS[file_format]
+    output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    if file_format == 'npz':
+        _write_npz(output)
+    else:
+        _write_arrow(output, file_format)
+    output.seek(0)
+    return output, content_type, extension
+
+
+def _to_columns(np, batch, species_index):
+    count = len(batch)
+    return {
+        'id': np.fromiter((row[0] for row in batch), dtype=np.int64, count=count),
+        'features': np.array([row[1:5] for row in batch], dtype=np.float32).reshape(count, 4),
+        'species': np.fromiter((species_index.get(row[5], -1) for row in batch), dtype=np.int8, count=count),
+        'lab_id': np.fromiter((row[6] if row[6] is not None else -1 for row in batch), dtype=np.int32, count=count),
+        'created_at': np.array([row[7].replace(tzinfo=None) for row in batch], dtype='datetime64[us]'),
+    }
+
+
+def _write_npz(output):
+    import numpy as np
+
+    columns = {'id': [], 'features': [], 'species': [], 'lab_id': [], 'created_at': []}
+    for batch in iter_column_batches():
+        for name, values in batch.items():
+            columns[name].append(values)
+
+    empty = {
+        'id': np.empty(0, np.int64),
+        'features': np.empty((0, 4), np.float32),
+        'species': np.empty(0, np.int8),
+        'lab_id': np.empty(0, np.int32),
+        'created_at': np.empty(0, 'datetime64[us]'),
+    }
+    arrays = {
+        name: np.concatenate(parts) if parts else empty[name]
+        for name, parts in columns.items()
+    }
+    np.savez_compressed(
+        output,
+        feature_names=np.array(FEATURE_FIELDS),
+        species_names=np.array(SPECIES_CODES),
+        **arrays
+    )
+
+
+def _write_arrow(output, file_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(name, pa.float32()) for name in FEATURE_FIELDS]
+        + [
+            ('species', pa.dictionary(pa.int8(), pa.string())),
+            ('id', pa.int64()),
+            ('lab_id', pa.int32()),
+            ('created_at', pa.timestamp('us', tz='UTC')),
+        ]
+    )
+    species_names = pa.array(SPECIES_CODES, type=pa.string())
+
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(output, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(output, schema)
+
+    try:
+        for batch in iter_column_batches():
+            features = batch['features']
+            species = batch['species']
+            lab_ids = batch['lab_id']
+            writer.write_batch(pa.record_batch(
+                [pa.array(features[:, index]) for index in range(len(FEATURE_FIELDS))]
+                + [
+                    pa.DictionaryArray.from_arrays(pa.array(species, mask=species < 0), species_names),
+                    pa.array(batch['id']),
+                    pa.array(lab_ids, mask=lab_ids < 0),
+                    pa.array(batch['created_at']).cast(pa.timestamp('us', tz='UTC')),
+                ],
+                schema=schema,
+            ))
+    finally:
+        writer.close()
@@ -0,0 +1,27 @@
+"""
+REST API filter backend driven by a Django form.
+
+The form (e.g. IrisSearchForm) is the single filter definition: it
+validates the query parameters and turns them into one combined Q with
+get_filter(), for the HTML search page and the API alike.
+"""
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class FormFilterBackend(BaseFilterBackend):
+    """
+    Filters with the view's filter_form_class on the actions listed in
+    filter_form_actions (default: list). Invalid values are a 400 error.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        form_class = getattr(view, 'filter_form_class', None)
+        if form_class is None or getattr(view, 'action', None) not in getattr(view, 'filter_form_actions', ('list',)):
+            return queryset
+
+        form = form_class.from_params(request.query_params)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        return queryset.filter(form.get_filter())
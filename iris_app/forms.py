@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import IrisPlant, Laboratory
@@ -117,13 +120,39 @@ class IrisForm(forms.ModelForm):
             if value is not None and value < 0:
                 raise forms.ValidationError('Measurement values cannot be negative.')
         
+        # external_id is not on the form, so its unique constraints are not checked by the model validation
+        lab = cleaned_data.get('lab')
+        if 'lab' in cleaned_data and IrisPlant.external_id_taken(self.instance.external_id, lab, self.instance.pk):
+            owner = 'this laboratory' if lab is not None else 'no laboratory'
+            self.add_error('lab', f"Another sample of {owner} has the external ID '{self.instance.external_id}'.")
+        
         return cleaned_data
 
 
 class IrisSearchForm(forms.Form):
-    """Iris data search form"""
+    """
+    Iris data search form
+    Also the filter definition of the REST API (see filters.py):
+    FILTER_LOOKUPS maps every field to the ORM lookup it filters on
+    """
     SPECIES_CHOICES = [('', '--- All Species ---')] + list(IrisPlant.SPECIES_CHOICES)
     
+    FILTER_LOOKUPS = {
+        'species': 'species',
+        'min_sepal_length': 'sepal_length__gte',
+        'max_sepal_length': 'sepal_length__lte',
+        'min_sepal_width': 'sepal_width__gte',
+        'max_sepal_width': 'sepal_width__lte',
+        'min_petal_length': 'petal_length__gte',
+        'max_petal_length': 'petal_length__lte',
+        'min_petal_width': 'petal_width__gte',
+        'max_petal_width': 'petal_width__lte',
+        'lab': 'lab',
+        'created_by': 'created_by_id',
+    }
+    # Older API parameter names
+    PARAMETER_ALIASES = {'lab_id': 'lab', 'created_by_id': 'created_by'}
+    
     species = forms.ChoiceField(
         choices=SPECIES_CHOICES,
         required=False,
@@ -157,6 +186,30 @@ class IrisSearchForm(forms.Form):
         label='Max Sepal Length'
     )
     
+    min_sepal_width = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-input',
+            'placeholder': 'Min Sepal Width (cm)',
+            'step': '0.1',
+            'type': 'number'
+        }),
+        label='Min Sepal Width'
+    )
+    
+    max_sepal_width = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-input',
+            'placeholder': 'Max Sepal Width (cm)',
+            'step': '0.1',
+            'type': 'number'
+        }),
+        label='Max Sepal Width'
+    )
+    
     min_petal_length = forms.FloatField(
         required=False,
         min_value=0,
@@ -181,6 +234,30 @@ class IrisSearchForm(forms.Form):
         label='Max Petal Length'
     )
     
+    min_petal_width = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-input',
+            'placeholder': 'Min Petal Width (cm)',
+            'step': '0.1',
+            'type': 'number'
+        }),
+        label='Min Petal Width'
+    )
+    
+    max_petal_width = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-input',
+            'placeholder': 'Max Petal Width (cm)',
+            'step': '0.1',
+            'type': 'number'
+        }),
+        label='Max Petal Width'
+    )
+    
     lab = forms.ModelChoiceField(
         queryset=Laboratory.objects.all(),
         required=False,
@@ -190,6 +267,40 @@ class IrisSearchForm(forms.Form):
         }),
         label='Laboratory'
     )
+    
+    created_by = forms.IntegerField(
+        required=False,
+        min_value=1,
+        widget=forms.HiddenInput,
+        label='Created By'
+    )
+    
+    @classmethod
+    def from_params(cls, params):
+        """Build the form from query parameters, accepting the older parameter names"""
+        data = params.copy()
+        for alias, name in cls.PARAMETER_ALIASES.items():
+            if alias in data and name not in data:
+                data[name] = data[alias]
+        return cls(data)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in IrisPlant.MEASUREMENT_FIELDS:
+            low = cleaned_data.get(f'min_{field}')
+            high = cleaned_data.get(f'max_{field}')
+            if low is not None and high is not None and low > high:
+                self.add_error(f'max_{field}', 'Max value cannot be smaller than the min value.')
+        return cleaned_data
+    
+    def get_filter(self):
+        """Return one Q combining every filled in criterion (form must be valid)"""
+        condition = Q()
+        for name, lookup in self.FILTER_LOOKUPS.items():
+            value = self.cleaned_data.get(name)
+            if value is not None and value != '':
+                condition &= Q(**{lookup: value})
+        return condition
 
 
 class IrisImportForm(forms.Form):
@@ -202,14 +313,25 @@ class IrisImportForm(forms.Form):
         }),
         help_text='CSV file must contain: sepal_length, sepal_width, petal_length, petal_width, species columns'
     )
+    background = forms.BooleanField(
+        required=False,
+        label='Process in background',
+        help_text='Files larger than the background threshold are always processed in background'
+    )
+    
+    @property
+    def max_upload_size(self):
+        return getattr(settings, 'IRIS_IMPORT_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
     
     def clean_csv_file(self):
         csv_file = self.cleaned_data.get('csv_file')
         if csv_file:
             if not csv_file.name.endswith('.csv'):
                 raise forms.ValidationError('Please upload a .csv file.')
-            if csv_file.size > 5 * 1024 * 1024:
-                raise forms.ValidationError('File size must be less than 5MB.')
+            if csv_file.size > self.max_upload_size:
+                raise forms.ValidationError(
+                    f'File size must be less than {filesizeformat(self.max_upload_size)}.'
+                )
         return csv_file
 
 
@@ -0,0 +1,381 @@
+"""
+CSV import pipeline for Iris samples.
+
+Rows are validated in chunks, laboratories are looked up with one
+in_bulk query per chunk (cached for the rest of the file), and valid
+rows are inserted with bulk_create inside a single transaction.
+Invalid rows are skipped and reported back with their line number.
+Rows with an external_id are upserts: they update the sample with the
+same laboratory and external_id (or are skipped when nothing changed),
+so a retried import does not duplicate samples. find_existing() and
+upsert_plants() are shared with the bulk REST API.
+Uploaded files are decoded incrementally chunk by chunk, so memory use
+does not depend on the file size. Large files can also be imported in
+the background as ImportJobs (see `manage.py run_import_worker`).
+"""
+
+import codecs
+import csv
+import math
+import re
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ImportJob, IrisPlant, Laboratory
+from .signals import TRACKED_FIELDS, apply_bulk_insert_summaries, apply_bulk_update_summaries
+
+
+MEASUREMENT_FIELDS = IrisPlant.MEASUREMENT_FIELDS
+SPECIES_CODES = {code for code, name in IrisPlant.SPECIES_CHOICES}
+EXTERNAL_ID_MAX_LENGTH = IrisPlant._meta.get_field('external_id').max_length
+# Columns an upsert overwrites; the creator and created_at are kept
+UPSERT_FIELDS = MEASUREMENT_FIELDS + ('species', 'updated_at')
+LINE_END = re.compile(r'\r\n|\r|\n')
+
+
+class ImportResult:
+    """
+    Outcome of a CSV import: imported count (of which updated_count
+    replaced samples with the same external_id), unchanged rows and
+    per-row errors. Only the first max_errors errors are kept, but all
+    are counted.
+    """
+
+    def __init__(self, max_errors=None):
+        self.imported_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors or getattr(settings, 'IRIS_IMPORT_MAX_REPORTED_ERRORS', 500)
+
+    @property
+    def processed_count(self):
+        return self.imported_count + self.unchanged_count + self.error_count
+
+    @property
+    def errors_truncated(self):
+        return self.error_count > len(self.errors)
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_number, 'error': message})
+
+
+def iter_lines(chunks, encoding='utf-8-sig'):
+    """
+    Decode an iterable of byte chunks and yield text lines (with their
+    line endings, as csv.reader expects). Only one chunk is held in memory.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        for match in LINE_END.finditer(pending):
+            if match.group() == '\r' and match.end() == len(pending):
+                # May be the first half of a \r\n split between chunks
+                break
+            yield pending[start:match.end()]
+            start = match.end()
+        pending = pending[start:]
+
+    pending += decoder.decode(b'', final=True)
+    start = 0
+    for match in LINE_END.finditer(pending):
+        yield pending[start:match.end()]
+        start = match.end()
+    if pending[start:]:
+        yield pending[start:]
+
+
+def import_csv_file(uploaded_file, user, batch_size=None):
+    """Stream an uploaded CSV file into the database; returns an ImportResult"""
+    reader = csv.DictReader(iter_lines(uploaded_file.chunks()))
+    return import_rows(reader, user, batch_size=batch_size)
+
+
+def parse_row(row):
+    """
+    Validate one CSV row.
+    Returns (values, lab_id) or raises ValueError with a readable message.
+    """
+    species = (row.get('species') or '').lower().strip()
+    if species not in SPECIES_CODES:
+        raise ValueError(f"invalid species '{row.get('species') or ''}'")
+
+    values = {'species': species}
+    for field in MEASUREMENT_FIELDS:
+        raw = (row.get(field) or '').strip()
+        if not raw:
+            raise ValueError(f'{field}: missing value')
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"{field}: '{raw}' is not a number")
+        if not math.isfinite(value):
+            raise ValueError(f"{field}: '{raw}' is not a finite number")
+        if value < 0:
+            raise ValueError(f'{field}: measurement values cannot be negative')
+        values[field] = value
+
+    external_id = (row.get('external_id') or '').strip()
+    if len(external_id) > EXTERNAL_ID_MAX_LENGTH:
+        raise ValueError(f'external_id: longer than {EXTERNAL_ID_MAX_LENGTH} characters')
+    values['external_id'] = external_id or None
+
+    lab_id = (row.get('lab_id') or '').strip()
+    if lab_id:
+        try:
+            lab_id = int(lab_id)
+        except ValueError:
+            raise ValueError(f"lab_id: '{lab_id}' is not a valid id")
+    return values, lab_id or None
+
+
+def import_rows(rows, user, batch_size=None, atomic=True, on_chunk=None, result=None, skip_rows=0):
+    """
+    Import an iterable of CSV dict rows (e.g. a csv.DictReader) for a user.
+    With atomic=True everything is written in one transaction, otherwise
+    each chunk is committed on its own. on_chunk(result) is called after
+    every chunk. To resume an import, pass its ImportResult so far and
+    the number of rows it processed as skip_rows. Returns an ImportResult.
+    """
+    batch_size = batch_size or getattr(settings, 'IRIS_IMPORT_BATCH_SIZE', 1000)
+    result = result or ImportResult()
+    labs = {}
+
+    with transaction.atomic() if atomic else nullcontext():
+        chunk = []
+        # Line 1 is the header row
+        for line_number, row in enumerate(rows, start=2):
+            if line_number < skip_rows + 2:
+                continue
+            chunk.append((line_number, row))
+            if len(chunk) >= batch_size:
+                _import_chunk(chunk, user, labs, result, batch_size, on_chunk)
+                chunk = []
+        if chunk:
+            _import_chunk(chunk, user, labs, result, batch_size, on_chunk)
+
+    return result
+
+
+def claim_import_job():
+    """
+    Mark the oldest pending ImportJob as running and return it.
+    Running jobs without progress for IRIS_IMPORT_STALE_AFTER seconds
+    (their worker died) are claimed again and resume after the rows they
+    processed. The conditional UPDATE makes this safe with several workers.
+    """
+    now = timezone.now()
+    stale_after = timedelta(seconds=getattr(settings, 'IRIS_IMPORT_STALE_AFTER', 600))
+    claimable = Q(status=ImportJob.STATUS_PENDING) | Q(
+        status=ImportJob.STATUS_RUNNING, updated_at__lt=now - stale_after
+    )
+    candidates = ImportJob.objects.filter(claimable).order_by('created_at')
+    for job_id in candidates.values_list('id', flat=True)[:10]:
+        claimed = ImportJob.objects.filter(claimable, pk=job_id).update(
+            status=ImportJob.STATUS_RUNNING,
+            started_at=Coalesce('started_at', Value(now)),
+            updated_at=now,
+        )
+        if claimed:
+            return ImportJob.objects.select_related('created_by').get(pk=job_id)
+    return None
+
+
+def run_import_job(job):
+    """
+    Process a claimed ImportJob. Chunks are committed one by one and the
+    job row is updated after each (counts and row errors), so progress can
+    be polled meanwhile and a reclaimed job resumes where it stopped.
+    A chunk committed just before its worker died may be imported again;
+    rows with an external_id are then upserted, not duplicated.
+    """
+    bytes_read = [0]
+    result = ImportResult()
+    result.imported_count = job.rows_imported
+    result.updated_count = job.rows_updated
+    result.unchanged_count = job.rows_unchanged
+    result.error_count = job.rows_failed
+    result.errors = list(job.errors)
+    skip_rows = job.rows_processed
+
+    def count_bytes(chunks):
+        for data in chunks:
+            bytes_read[0] += len(data)
+            yield data
+
+    def save_progress(result):
+        ImportJob.objects.filter(pk=job.pk).update(
+            bytes_processed=bytes_read[0],
+            rows_processed=result.processed_count,
+            rows_imported=result.imported_count,
+            rows_updated=result.updated_count,
+            rows_unchanged=result.unchanged_count,
+            rows_failed=result.error_count,
+            errors=result.errors,
+            updated_at=timezone.now(),
+        )
+
+    try:
+        with job.csv_file.open('rb') as csv_file:
+            reader = csv.DictReader(iter_lines(count_bytes(csv_file.chunks())))
+            import_rows(
+                reader, job.created_by, atomic=False, on_chunk=save_progress, result=result, skip_rows=skip_rows
+            )
+    except Exception as e:
+        # Keeps the counts and row errors of the committed chunks
+        job.refresh_from_db()
+        job.status = ImportJob.STATUS_FAILED
+        job.error_message = str(e)
+    else:
+        job.status = ImportJob.STATUS_COMPLETED
+        job.bytes_processed = job.total_bytes
+        job.rows_processed = result.processed_count
+        job.rows_imported = result.imported_count
+        job.rows_updated = result.updated_count
+        job.rows_unchanged = result.unchanged_count
+        job.rows_failed = result.error_count
+        job.errors = result.errors
+        job.csv_file.delete(save=False)
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def find_existing(plants):
+    """
+    Return {(lab_id, external_id): stored values} of the samples that the
+    plants with an external_id would replace, with one query
+    """
+    keys = defaultdict(set)
+    for plant in plants:
+        if plant.external_id:
+            keys[plant.lab_id].add(plant.external_id)
+    if not keys:
+        return {}
+
+    query = Q()
+    for lab_id, external_ids in keys.items():
+        query |= Q(lab_id=lab_id, external_id__in=external_ids)
+    rows = IrisPlant.objects.filter(query).order_by().values('id', 'created_by_id', 'external_id', *TRACKED_FIELDS)
+    return {(row['lab_id'], row['external_id']): row for row in rows}
+
+
+def upsert_plants(plants, existing, batch_size):
+    """
+    Write unsaved plants and update the summaries. A plant whose
+    (lab_id, external_id) is in existing (see find_existing) replaces
+    that sample, keeping its creator, or is skipped when nothing
+    changed; the others are inserted. Keys must be unique within plants.
+    Returns the status of every plant: created, updated or unchanged.
+    Run find_existing() in the same transaction: a sample inserted with
+    one of the keys since the lookup makes the insert raise IntegrityError.
+    """
+    statuses, created, changes = [], [], []
+    for plant in plants:
+        row = existing.get((plant.lab_id, plant.external_id)) if plant.external_id else None
+        if row is None:
+            statuses.append('created')
+            created.append(plant)
+            continue
+        plant.pk = row['id']
+        plant.created_by_id = row['created_by_id']
+        previous = {field: row[field] for field in TRACKED_FIELDS}
+        if previous == {field: getattr(plant, field) for field in TRACKED_FIELDS}:
+            statuses.append('unchanged')
+            continue
+        statuses.append('updated')
+        changes.append((previous, plant))
+
+    with transaction.atomic(savepoint=False):
+        if created:
+            IrisPlant.objects.bulk_create(created, batch_size=batch_size)
+        if changes:
+            # One statement per batch; the rows are matched on their id
+            IrisPlant.objects.bulk_create(
+                [plant for previous, plant in changes], batch_size=batch_size, update_conflicts=True,
+                unique_fields=['pk'], update_fields=UPSERT_FIELDS
+            )
+        # Bulk writes send no signals, so update the summaries here
+        if created:
+            apply_bulk_insert_summaries(created)
+        if changes:
+            apply_bulk_update_summaries(changes)
+    return statuses
+
+
+def _import_chunk(chunk, user, labs, result, batch_size, on_chunk):
+    parsed = []
+    for line_number, row in chunk:
+        try:
+            values, lab_id = parse_row(row)
+        except ValueError as e:
+            result.add_error(line_number, str(e))
+            continue
+        parsed.append((line_number, values, lab_id))
+
+    missing_lab_ids = {lab_id for line_number, values, lab_id in parsed if lab_id and lab_id not in labs}
+    if missing_lab_ids:
+        found = Laboratory.objects.in_bulk(missing_lab_ids)
+        for lab_id in missing_lab_ids:
+            labs[lab_id] = found.get(lab_id)
+
+    plants, key_lines = [], {}
+    for line_number, values, lab_id in parsed:
+        if lab_id and labs[lab_id] is None and values['external_id']:
+            # Without its laboratory the external_id would match a sample of no laboratory
+            result.add_error(line_number, f'lab_id: laboratory {lab_id} does not exist')
+            continue
+        # Unknown laboratories of rows without an external_id are imported without a lab, like before
+        plant = IrisPlant(lab=labs.get(lab_id) if lab_id else None, created_by=user, **values)
+        if plant.external_id:
+            key = (plant.lab_id, plant.external_id)
+            if key in key_lines:
+                result.add_error(line_number, f"external_id: '{plant.external_id}' repeats line {key_lines[key]}")
+                continue
+            key_lines[key] = line_number
+        plants.append((line_number, plant))
+
+    # The lookup, the ownership check and the upsert share one transaction
+    # (a savepoint in atomic mode), so they see the same rows. If a sample
+    # with one of the keys is inserted meanwhile, the chunk is retried once.
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = find_existing(plant for line_number, plant in plants)
+                allowed, denied = [], []
+                for line_number, plant in plants:
+                    row = existing.get((plant.lab_id, plant.external_id)) if plant.external_id else None
+                    if row and row['created_by_id'] != user.pk and not user.is_superuser:
+                        denied.append((line_number, f"external_id: '{plant.external_id}' is a sample of another user"))
+                        continue
+                    allowed.append(plant)
+                statuses = upsert_plants(allowed, existing, batch_size)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+            for line_number, plant in plants:
+                plant.pk = None
+                plant.created_by = user
+
+    for line_number, message in denied:
+        result.add_error(line_number, message)
+    result.imported_count += len(statuses) - statuses.count('unchanged')
+    result.updated_count += statuses.count('updated')
+    result.unchanged_count += statuses.count('unchanged')
+
+    if on_chunk is not None:
+        on_chunk(result)
@@ -0,0 +1,167 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter (settings are read at startup)
+SETUP = """
+import django, os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iris_config.settings')
+django.setup()
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from iris_app import importers
+from iris_app.models import IrisPlant, Laboratory
+
+SPECIES = ('setosa', 'versicolor', 'virginica')
+
+def sample_rows(count, offset=0):
+    lab_ids = list(Laboratory.objects.values_list('id', flat=True)) or ['']
+    return [
+        {{
+            'sepal_length': f'{{4.3 + (offset + index) % 36 / 10:.1f}}', 'sepal_width': '3.0',
+            'petal_length': f'{{1.0 + (offset + index) % 59 / 10:.1f}}', 'petal_width': '1.2',
+            'species': SPECIES[(offset + index) % 3], 'lab_id': str(lab_ids[(offset + index) % len(lab_ids)]),
+        }}
+        for index in range(count)
+    ]
+
+user, created = User.objects.get_or_create(username='sqlite-benchmark')
+"""
+
+SEED = SETUP + """
+call_command('migrate', verbosity=0)
+missing = {rows} - IrisPlant.objects.count()
+if missing > 0:
+    importers.import_rows(sample_rows(missing), user)
+"""
+
+PROBE = SETUP + """
+import json, threading, time
+from django.db import OperationalError, close_old_connections
+from django.db.models import Count
+
+results = {{'reads': [], 'writes': [], 'failed': 0}}
+lock = threading.Lock()
+
+def read():
+    # Dashboard page and per-species counts
+    list(IrisPlant.objects.filter(petal_length__gte=1.5).order_by('-created_at', '-id')
+         .values('id', 'species', 'petal_length', 'lab__name')[:50])
+    list(IrisPlant.objects.values('species').annotate(total=Count('id')).order_by())
+
+def write(offset):
+    # A small import: lab lookup, insert and summary updates in one transaction
+    importers.import_rows(sample_rows({rows_per_write}, offset), user)
+
+def worker(kind, number):
+    deadline = start + {duration}
+    offset = number * 1000000
+    while time.perf_counter() < deadline:
+        # Like a request: connections older than CONN_MAX_AGE are closed at both ends
+        close_old_connections()
+        began = time.perf_counter()
+        try:
+            if kind == 'reads':
+                read()
+            else:
+                write(offset)
+                offset += {rows_per_write}
+        except OperationalError:
+            with lock:
+                results['failed'] += 1
+        else:
+            with lock:
+                results[kind].append(time.perf_counter() - began)
+        finally:
+            close_old_connections()
+
+start = time.perf_counter()
+threads = [threading.Thread(target=worker, args=('reads', number)) for number in range({readers})]
+threads += [threading.Thread(target=worker, args=('writes', number)) for number in range({writers})]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'elapsed': elapsed,
+    'reads': sorted(results['reads']),
+    'writes': sorted(results['writes']),
+    'failed': results['failed'],
+}}))
+"""
+
+# SQLite defaults and no connection reuse, as before the tuning
+DEFAULT_ENV = {
+    'IRIS_DB_CONN_MAX_AGE': '0',
+    'IRIS_SQLITE_TRANSACTION_MODE': '',
+    'IRIS_SQLITE_JOURNAL_MODE': 'delete',
+    'IRIS_SQLITE_SYNCHRONOUS': 'full',
+    'IRIS_SQLITE_CACHE_SIZE': '-2000',
+    'IRIS_SQLITE_MMAP_SIZE': '0',
+    'IRIS_SQLITE_BUSY_TIMEOUT': '5000',
+}
+
+
+class Command(BaseCommand):
+    """Measure concurrent read/write throughput with the SQLite defaults and with the tuned settings"""
+    help = 'Compare concurrent reads and writes on a copy of the database: SQLite defaults vs IRIS_SQLITE_* settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run (default: 5)')
+        parser.add_argument('--readers', type=int, default=4, help='Reading threads (default: 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Writing threads (default: 2)')
+        parser.add_argument('--rows-per-write', type=int, default=20, help='Rows imported per write (default: 20)')
+        parser.add_argument('--rows', type=int, default=20000, help='Samples in the database before the runs')
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            # The runs never touch the configured database
+            template = Path(directory) / 'template.sqlite3'
+            self.copy_database(source, template)
+            self.run_probe(SEED.format(rows=options['rows']), template, {})
+
+            for label, env in (('SQLite defaults', DEFAULT_ENV), ('tuned', {})):
+                database = Path(directory) / f"{label.replace(' ', '_')}.sqlite3"
+                self.copy_database(template, database)
+                output = self.run_probe(PROBE.format(**options), database, env)
+                result = json.loads(output.strip().splitlines()[-1])
+                self.stdout.write(self.format_result(label, result, options['rows_per_write']))
+
+    def copy_database(self, source, target):
+        """Consistent copy with the backup API (includes pages still in a WAL file)"""
+        source_connection, target_connection = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            source_connection.backup(target_connection)
+        finally:
+            source_connection.close()
+            target_connection.close()
+
+    def run_probe(self, probe, database, env):
+        env = {**os.environ, **env, 'IRIS_DB_PATH': str(database), 'PYTHONWARNINGS': 'ignore'}
+        return subprocess.run(
+            [sys.executable, '-c', probe],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+
+    def format_result(self, label, result, rows_per_write):
+        elapsed = result['elapsed']
+        reads, writes = result['reads'], result['writes']
+
+        def p95(latencies):
+            return latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+
+        return (
+            f"{label}: {len(reads) / elapsed:.0f} reads/s (p95 {p95(reads):.1f} ms), "
+            f"{len(writes) * rows_per_write / elapsed:.0f} rows written/s (p95 {p95(writes):.1f} ms per write), "
+            f"{result['failed']} failed with 'database is locked'"
+        )
@@ -0,0 +1,56 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter: time to load the WSGI app, then the first prediction
+PROBE = """
+import json, time
+start = time.perf_counter()
+from iris_config.wsgi import application
+loaded = time.perf_counter()
+from iris_app import model_registry
+model_registry.predict_proba('{algorithm}', [[5.1, 3.5, 1.4, 0.2]])
+predicted = time.perf_counter()
+print(json.dumps({{'startup': loaded - start, 'first_prediction': predicted - loaded}}))
+"""
+
+
+class Command(BaseCommand):
+    """Measure worker startup and first-prediction latency with and without warm-up"""
+    help = 'Compare startup time and first prediction latency for IRIS_ML_WARMUP off/on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Runs per mode (default: 5)')
+        parser.add_argument('--algorithm', default='logistic', help='Algorithm to predict with')
+
+    def handle(self, *args, **options):
+        from iris_app import model_registry
+
+        # Make sure a model is published, otherwise the first prediction includes training
+        if model_registry.is_stale(options['algorithm']):
+            model_registry.train_model(options['algorithm'])
+
+        probe = PROBE.format(algorithm=options['algorithm'])
+        for warmup in ('0', '1'):
+            env = {**os.environ, 'IRIS_ML_WARMUP': warmup, 'PYTHONWARNINGS': 'ignore'}
+            results = []
+            for _ in range(options['runs']):
+                output = subprocess.run(
+                    [sys.executable, '-c', probe],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+                ).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+
+            startup = statistics.median(result['startup'] for result in results) * 1000
+            first = statistics.median(result['first_prediction'] for result in results) * 1000
+            self.stdout.write(
+                f"IRIS_ML_WARMUP={warmup}: startup {startup:.1f} ms, "
+                f"first prediction {first:.1f} ms, total {startup + first:.1f} ms "
+                f"(median of {options['runs']} runs)"
+            )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from iris_app import dataset_cache, summary
+
+
+class Command(BaseCommand):
+    """Verify and rebuild the IrisStatistics summary table"""
+    help = 'Recompute the IrisStatistics summary rows from the IrisPlant table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare the stored statistics with a fresh computation'
+        )
+
+    def handle(self, *args, **options):
+        stored = summary.get_statistics()
+
+        if options['check']:
+            # Rebuild in a transaction that is rolled back, so nothing is written
+            with transaction.atomic():
+                summary.rebuild_statistics(all_groups=True)
+                fresh = summary.get_statistics()
+                transaction.set_rollback(True)
+            # Compare counts exactly and the rest with float tolerance
+            if not _same(stored, fresh):
+                raise CommandError('The stored statistics are out of date.')
+            self.stdout.write(self.style.SUCCESS('The stored statistics are correct.'))
+            return
+
+        summary.rebuild_statistics(all_groups=True)
+        fresh = summary.get_statistics()
+        if not _same(stored, fresh):
+            # Cached statistics (and their ETag) still hold the old numbers
+            dataset_cache.bump_generation()
+        total = fresh['total_statistics']['total_samples']
+        self.stdout.write(self.style.SUCCESS(f'Statistics rebuilt for {total} samples.'))
+
+
+def _same(left, right, tolerance=1e-6):
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(_same(left[key], right[key], tolerance) for key in left)
+    if isinstance(left, list) and isinstance(right, list):
+        return len(left) == len(right) and all(_same(a, b, tolerance) for a, b in zip(left, right))
+    if isinstance(left, float) and isinstance(right, float):
+        return abs(left - right) <= tolerance * max(1.0, abs(left), abs(right))
+    return left == right
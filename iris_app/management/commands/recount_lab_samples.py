@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from iris_app import dataset_cache
+from iris_app.models import Laboratory
+
+
+class Command(BaseCommand):
+    """Verify and repair the denormalized Laboratory.sample_count counters"""
+    help = 'Recompute Laboratory.sample_count from the IrisPlant table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only verify the counters; exit with an error if any is wrong'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            labs = Laboratory.objects.annotate(actual_count=Count('iris_plants')).order_by('pk')
+            wrong = [lab for lab in labs if lab.sample_count != lab.actual_count]
+
+            for lab in wrong:
+                self.stdout.write(
+                    f'{lab.name}: stored {lab.sample_count}, actual {lab.actual_count}'
+                )
+                if not options['check']:
+                    Laboratory.objects.filter(pk=lab.pk).update(sample_count=lab.actual_count)
+            if wrong and not options['check']:
+                # Cached statistics and counts still hold the old numbers
+                dataset_cache.bump_generation()
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('All laboratory sample counts are correct.'))
+        elif options['check']:
+            raise CommandError(f'{len(wrong)} laboratory sample count(s) are out of date.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(wrong)} laboratory sample count(s) fixed.'))
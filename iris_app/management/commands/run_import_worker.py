@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from iris_app import importers
+from iris_app.models import ImportJob
+
+
+class Command(BaseCommand):
+    """Process background CSV import jobs with a local thread pool"""
+    help = 'Run the background CSV import worker (no external broker required)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of jobs processed in parallel (default: 1, SQLite allows a single writer)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds between checks for new jobs (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when there are no pending jobs left'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Import worker started with {workers} thread(s).')
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    running = {future for future in running if not future.done()}
+                    while len(running) < workers:
+                        job = importers.claim_import_job()
+                        if job is None:
+                            break
+                        self.stdout.write(f'Job {job.pk}: importing {job.file_name}')
+                        running.add(executor.submit(self.process, job))
+
+                    if options['once'] and not running:
+                        break
+                    time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping, waiting for running jobs to finish...')
+
+    def process(self, job):
+        try:
+            job = importers.run_import_job(job)
+            if job.status == ImportJob.STATUS_COMPLETED:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk}: {job.rows_imported} rows imported ({job.rows_updated} updated), '
+                    f'{job.rows_unchanged} unchanged, {job.rows_failed} failed ({job.throughput} rows/s)'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job {job.pk}: failed - {job.error_message}'))
+        finally:
+            # Each pool thread has its own database connection
+            connection.close()
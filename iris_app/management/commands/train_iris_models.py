@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from iris_app import model_registry
+
+
+class Command(BaseCommand):
+    """Train the prediction models and publish them to the model registry"""
+    help = (
+        'Train the ML prediction models on the IrisPlant table and save them to IRIS_MODEL_DIR. '
+        'Models are only retrained when the table changed since their last version.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            choices=sorted(model_registry.ALGORITHM_NAMES),
+            action='append',
+            help='Algorithm to train (can be repeated). Defaults to all algorithms.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Retrain even if the data did not change.'
+        )
+
+    def handle(self, *args, **options):
+        algorithms = options['algorithm'] or list(model_registry.ALGORITHM_NAMES)
+        signature = model_registry.get_data_signature()
+
+        stale = []
+        for algorithm in algorithms:
+            if options['force'] or model_registry.is_stale(algorithm, signature):
+                stale.append(algorithm)
+            else:
+                model = model_registry.get_model(algorithm)
+                self.stdout.write(
+                    f'{model_registry.ALGORITHM_NAMES[algorithm]}: up to date (version {model.version})'
+                )
+
+        if not stale:
+            return
+
+        # Load the training data once and share it between all stale algorithms
+        data = model_registry.load_training_data()
+        for algorithm in stale:
+            model = model_registry.train_model(algorithm, data=data)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model_registry.ALGORITHM_NAMES[algorithm]}: trained version {model.version} '
+                f'on {model.sample_count} samples'
+            ))
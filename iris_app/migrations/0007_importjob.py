@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0006_alter_irisplant_options_alter_laboratory_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('csv_file', models.FileField(upload_to='imports/', verbose_name='CSV File')),
+                ('file_name', models.CharField(max_length=255, verbose_name='File Name')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('total_bytes', models.BigIntegerField(default=0, verbose_name='Total Bytes')),
+                ('bytes_processed', models.BigIntegerField(default=0, verbose_name='Bytes Processed')),
+                ('rows_processed', models.IntegerField(default=0, verbose_name='Rows Processed')),
+                ('rows_imported', models.IntegerField(default=0, verbose_name='Rows Imported')),
+                ('rows_failed', models.IntegerField(default=0, verbose_name='Rows Failed')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Row Errors')),
+                ('error_message', models.TextField(blank=True, verbose_name='Error Message')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Created By')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='iris_app_im_status_826292_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+def fill_sample_counts(apps, schema_editor):
+    Laboratory = apps.get_model('iris_app', 'Laboratory')
+    for lab in Laboratory.objects.annotate(count=models.Count('iris_plants')):
+        Laboratory.objects.filter(pk=lab.pk).update(sample_count=lab.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0007_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laboratory',
+            name='sample_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of Iris samples in this laboratory (maintained automatically)', verbose_name='Sample Count'),
+        ),
+        migrations.RunPython(fill_sample_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+MEASUREMENT_FIELDS = ('sepal_length', 'sepal_width', 'petal_length', 'petal_width')
+
+
+def fill_statistics(apps, schema_editor):
+    IrisPlant = apps.get_model('iris_app', 'IrisPlant')
+    IrisStatistics = apps.get_model('iris_app', 'IrisStatistics')
+
+    aggregates = {'count': models.Count('id')}
+    for field in MEASUREMENT_FIELDS:
+        aggregates[f'{field}_sum'] = models.Sum(field)
+        aggregates[f'{field}_sum_sq'] = models.Sum(models.F(field) * models.F(field))
+        aggregates[f'{field}_min'] = models.Min(field)
+        aggregates[f'{field}_max'] = models.Max(field)
+
+    rows = IrisPlant.objects.order_by().values('species', 'lab_id').annotate(**aggregates)
+    IrisStatistics.objects.bulk_create([IrisStatistics(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0008_laboratory_sample_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IrisStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('species', models.CharField(max_length=50, verbose_name='Species')),
+                ('count', models.IntegerField(default=0, verbose_name='Sample Count')),
+                ('sepal_length_sum', models.FloatField(default=0, verbose_name='Sepal Length Sum')),
+                ('sepal_length_sum_sq', models.FloatField(default=0, verbose_name='Sepal Length Sum of Squares')),
+                ('sepal_length_min', models.FloatField(blank=True, null=True, verbose_name='Sepal Length Min')),
+                ('sepal_length_max', models.FloatField(blank=True, null=True, verbose_name='Sepal Length Max')),
+                ('sepal_width_sum', models.FloatField(default=0, verbose_name='Sepal Width Sum')),
+                ('sepal_width_sum_sq', models.FloatField(default=0, verbose_name='Sepal Width Sum of Squares')),
+                ('sepal_width_min', models.FloatField(blank=True, null=True, verbose_name='Sepal Width Min')),
+                ('sepal_width_max', models.FloatField(blank=True, null=True, verbose_name='Sepal Width Max')),
+                ('petal_length_sum', models.FloatField(default=0, verbose_name='Petal Length Sum')),
+                ('petal_length_sum_sq', models.FloatField(default=0, verbose_name='Petal Length Sum of Squares')),
+                ('petal_length_min', models.FloatField(blank=True, null=True, verbose_name='Petal Length Min')),
+                ('petal_length_max', models.FloatField(blank=True, null=True, verbose_name='Petal Length Max')),
+                ('petal_width_sum', models.FloatField(default=0, verbose_name='Petal Width Sum')),
+                ('petal_width_sum_sq', models.FloatField(default=0, verbose_name='Petal Width Sum of Squares')),
+                ('petal_width_min', models.FloatField(blank=True, null=True, verbose_name='Petal Width Min')),
+                ('petal_width_max', models.FloatField(blank=True, null=True, verbose_name='Petal Width Max')),
+                ('lab', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='iris_statistics', to='iris_app.laboratory', verbose_name='Laboratory')),
+            ],
+            options={
+                'verbose_name': 'Iris Statistics',
+                'verbose_name_plural': 'Iris Statistics',
+                'constraints': [models.UniqueConstraint(fields=('species', 'lab'), name='unique_statistics_species_lab'), models.UniqueConstraint(condition=models.Q(('lab__isnull', True)), fields=('species',), name='unique_statistics_species_without_lab')],
+            },
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
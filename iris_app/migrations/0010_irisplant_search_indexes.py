@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0009_irisstatistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='irisplant',
+            name='iris_app_ir_species_9b8003_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='irisplant',
+            name='iris_app_ir_created_77cd75_idx',
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['species', 'petal_length'], name='iris_app_ir_species_031568_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['species', 'sepal_length'], name='iris_app_ir_species_68f575_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['sepal_length'], name='iris_app_ir_sepal_l_8f611d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['sepal_width'], name='iris_app_ir_sepal_w_4a2c3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['petal_length'], name='iris_app_ir_petal_l_271149_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['petal_width'], name='iris_app_ir_petal_w_ec8865_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['lab', 'created_at'], name='iris_app_ir_lab_id_8a29df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['created_by', 'created_at'], name='iris_app_ir_created_648ee8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='irisplant',
+            index=models.Index(fields=['updated_at'], name='iris_app_ir_updated_2284d8_idx'),
+        ),
+    ]
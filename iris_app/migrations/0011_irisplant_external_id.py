@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 15:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0010_irisplant_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='irisplant',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Identifier given by the client, unique per laboratory (imports and bulk writes upsert on it)', max_length=100, null=True, verbose_name='External ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='irisplant',
+            constraint=models.UniqueConstraint(fields=('lab', 'external_id'), name='iris_external_id_per_lab'),
+        ),
+        migrations.AddConstraint(
+            model_name='irisplant',
+            constraint=models.UniqueConstraint(condition=models.Q(('lab__isnull', True)), fields=('external_id',), name='iris_external_id_without_lab'),
+        ),
+    ]
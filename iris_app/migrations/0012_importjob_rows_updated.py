@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iris_app', '0011_irisplant_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_unchanged',
+            field=models.IntegerField(default=0, verbose_name='Rows Unchanged'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_updated',
+            field=models.IntegerField(default=0, verbose_name='Rows Updated'),
+        ),
+    ]
@@ -0,0 +1,253 @@
+"""
+Model registry for the ML prediction page.
+
+Models are trained on the labelled IrisPlant rows (or the bundled UCI
+dataset while the table is still too small). Each algorithm is trained
+once, serialized (scaler + estimator pipeline) to IRIS_MODEL_DIR together
+with a version hash, and kept in a process-wide cache. A prediction is then only a transform + predict_proba.
+When a newer model file is written (e.g. by `manage.py train_iris_models`)
+the running workers pick it up on their next request.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Max, Value, When
+from django.utils import timezone
+
+from .forms import IrisPredictionForm
+from .models import IrisPlant
+
+
+ALGORITHM_NAMES = dict(IrisPredictionForm.ALGORITHM_CHOICES)
+DEFAULT_ALGORITHM = 'logistic'
+
+LoadedModel = namedtuple('LoadedModel', [
+    'algorithm', 'version', 'pipeline', 'classes', 'trained_at', 'data_signature', 'sample_count',
+])
+TrainingData = namedtuple('TrainingData', ['X', 'y', 'classes', 'signature'])
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def get_model_dir():
+    """Return the directory where trained models are stored"""
+    return Path(getattr(settings, 'IRIS_MODEL_DIR', Path(settings.BASE_DIR) / 'ml_models'))
+
+
+def get_model_path(algorithm):
+    """Return the file path of the current model for an algorithm"""
+    return get_model_dir() / f'{algorithm}.pkl'
+
+
+def build_estimator(algorithm):
+    """Create an untrained scaler + estimator pipeline"""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    if algorithm == 'knn':
+        model = KNeighborsClassifier(n_neighbors=3)
+    elif algorithm == 'svc':
+        model = SVC(probability=True, kernel='rbf', random_state=42)
+    else:
+        model = LogisticRegression(max_iter=200, random_state=42)
+    return make_pipeline(StandardScaler(), model)
+
+
+def get_data_signature():
+    """
+    Return a cheap fingerprint of the IrisPlant table.
+    Any insert, update or delete changes it, so models are only
+    retrained when the labelled data actually changed.
+    """
+    stats = IrisPlant.objects.order_by().aggregate(
+        count=Count('id'),
+        max_id=Max('id'),
+        max_updated_at=Max('updated_at'),
+    )
+    max_updated_at = stats['max_updated_at']
+    return '{}:{}:{}'.format(
+        stats['count'],
+        stats['max_id'] or 0,
+        max_updated_at.isoformat() if max_updated_at else '-',
+    )
+
+
+def load_training_data():
+    """
+    Return a TrainingData built from the labelled IrisPlant rows.
+    Falls back to the bundled UCI dataset while the table is too small
+    or does not contain every species yet.
+    """
+    import numpy as np
+
+    signature = get_data_signature()
+    classes = [code for code, name in IrisPlant.SPECIES_CHOICES]
+    species_code = Case(
+        *[When(species=code, then=Value(index)) for index, code in enumerate(classes)],
+        default=Value(None),
+        output_field=IntegerField(),
+    )
+    rows = (
+        IrisPlant.objects.order_by()
+        .annotate(species_code=species_code)
+        .filter(species_code__isnull=False)
+        .values_list(*IrisPlant.MEASUREMENT_FIELDS, 'species_code')
+    )
+    matrix = np.array(list(rows), dtype=np.float64).reshape(-1, 5)
+    X, y = matrix[:, :4], matrix[:, 4].astype(np.int64)
+
+    min_samples = getattr(settings, 'IRIS_MODEL_MIN_SAMPLES', 30)
+    if len(y) < min_samples or len(np.unique(y)) < len(classes):
+        return load_bundled_data(signature)
+    return TrainingData(X, y, classes, signature)
+
+
+def load_bundled_data(signature='uci'):
+    """Return a TrainingData built from the bundled UCI Iris dataset"""
+    from sklearn.datasets import load_iris
+
+    iris_data = load_iris()
+    return TrainingData(iris_data.data, iris_data.target, list(iris_data.target_names), signature)
+
+
+def train_model(algorithm, data=None):
+    """Train an algorithm and write it to disk, returning the LoadedModel"""
+    if algorithm not in ALGORITHM_NAMES:
+        raise ValueError(f'Unknown algorithm: {algorithm}')
+
+    data = data if data is not None else load_training_data()
+    pipeline = build_estimator(algorithm)
+    pipeline.fit(data.X, data.y)
+
+    classes = [str(name) for name in data.classes]
+    digest = hashlib.sha256(pickle.dumps((pipeline, classes), protocol=pickle.HIGHEST_PROTOCOL))
+    payload = {
+        'algorithm': algorithm,
+        'version': digest.hexdigest()[:12],
+        'pipeline': pipeline,
+        'classes': classes,
+        'trained_at': timezone.now().isoformat(),
+        'data_signature': data.signature,
+        'sample_count': len(data.y),
+    }
+    _write_atomic(get_model_path(algorithm), pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return _remember(algorithm, payload, _file_signature(get_model_path(algorithm)))
+
+
+def is_stale(algorithm, signature=None):
+    """Return True if the algorithm has no model or was trained on older data"""
+    if _file_signature(get_model_path(algorithm)) is None:
+        return True
+    signature = signature if signature is not None else get_data_signature()
+    return get_model(algorithm).data_signature != signature
+
+
+def get_model(algorithm):
+    """
+    Return the cached model for an algorithm.
+    Loads it from disk when the file changed, and trains it on first use.
+    """
+    if algorithm not in ALGORITHM_NAMES:
+        algorithm = DEFAULT_ALGORITHM
+
+    path = get_model_path(algorithm)
+    signature = _file_signature(path)
+    cached = _cache.get(algorithm)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _lock:
+        signature = _file_signature(path)
+        cached = _cache.get(algorithm)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        if signature is None:
+            return train_model(algorithm)
+        with open(path, 'rb') as model_file:
+            payload = pickle.load(model_file)
+        return _remember(algorithm, payload, signature)
+
+
+def predict_proba(algorithm, rows):
+    """Return (model, probabilities) for a 2-D array of feature rows"""
+    model = get_model(algorithm)
+    return model, model.pipeline.predict_proba(rows)
+
+
+def warm_up():
+    """
+    Import scikit-learn and load every published model into memory.
+    Called from IrisAppConfig.ready() when IRIS_ML_WARMUP is enabled, so
+    a preloading server (e.g. gunicorn --preload) shares the pages with
+    its forked workers. Models that were never trained are skipped here:
+    training needs the database, which is not available during startup.
+    """
+    import numpy as np
+    import sklearn.linear_model  # noqa: F401
+    import sklearn.neighbors  # noqa: F401
+    import sklearn.pipeline  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    import sklearn.svm  # noqa: F401
+
+    loaded = []
+    sample = np.zeros((1, 4))
+    for algorithm in ALGORITHM_NAMES:
+        if _file_signature(get_model_path(algorithm)) is None:
+            continue
+        model = get_model(algorithm)
+        model.pipeline.predict_proba(sample)
+        loaded.append(algorithm)
+    return loaded
+
+
+def clear_cache():
+    """Drop all in-memory models (they are reloaded from disk on next use)"""
+    with _lock:
+        _cache.clear()
+
+
+def _remember(algorithm, payload, signature):
+    model = LoadedModel(
+        algorithm=algorithm,
+        version=payload['version'],
+        pipeline=payload['pipeline'],
+        classes=payload['classes'],
+        trained_at=payload['trained_at'],
+        data_signature=payload.get('data_signature'),
+        sample_count=payload.get('sample_count'),
+    )
+    _cache[algorithm] = (signature, model)
+    return model
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _write_atomic(path, body):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.stem}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(body)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 class Laboratory(models.Model):
     """
@@ -42,6 +43,12 @@ class Laboratory(models.Model):
         null=True,
         verbose_name="Established Year"
     )
+    sample_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Sample Count",
+        help_text="Number of Iris samples in this laboratory (maintained automatically)"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
@@ -60,7 +67,7 @@ class Laboratory(models.Model):
     @property
     def iris_count(self):
         """Returns the count of Iris samples in this laboratory"""
-        return self.iris_plants.count()
+        return self.sample_count
 
 
 class IrisPlant(models.Model):
@@ -74,6 +81,8 @@ class IrisPlant(models.Model):
         ('versicolor', 'Iris Versicolor'),
         ('virginica', 'Iris Virginica'),
     ]
+    # The four measurements, in UCI column order
+    MEASUREMENT_FIELDS = ('sepal_length', 'sepal_width', 'petal_length', 'petal_width')
     
     sepal_length = models.FloatField(
         verbose_name="Sepal Length (cm)",
@@ -121,6 +130,14 @@ class IrisPlant(models.Model):
         help_text="User who created this record"
     )
     
+    external_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name="External ID",
+        help_text="Identifier given by the client, unique per laboratory (imports and bulk writes upsert on it)"
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Created At"
@@ -135,9 +152,28 @@ class IrisPlant(models.Model):
         verbose_name = 'Iris Sample'
         verbose_name_plural = 'Iris Samples'
         indexes = [
-            models.Index(fields=['species']),
+            # Species plus a measurement range (search page, search/advanced)
+            models.Index(fields=['species', 'petal_length']),
+            models.Index(fields=['species', 'sepal_length']),
+            # Measurement ranges without a species filter
+            models.Index(fields=['sepal_length']),
+            models.Index(fields=['sepal_width']),
+            models.Index(fields=['petal_length']),
+            models.Index(fields=['petal_width']),
+            # Per laboratory / per user lists, newest first
+            models.Index(fields=['lab', 'created_at']),
+            models.Index(fields=['created_by', 'created_at']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['created_by']),
+            # Change detection (model retraining, similarity index sync)
+            models.Index(fields=['updated_at']),
+        ]
+        constraints = [
+            # Upsert key of imports and bulk writes; samples without a
+            # laboratory share one namespace (NULL lab ids are never equal)
+            models.UniqueConstraint(fields=['lab', 'external_id'], name='iris_external_id_per_lab'),
+            models.UniqueConstraint(
+                fields=['external_id'], condition=models.Q(lab__isnull=True), name='iris_external_id_without_lab'
+            ),
         ]
 
     def __str__(self):
@@ -145,4 +181,140 @@ class IrisPlant(models.Model):
     
     def get_species_display_tr(self):
         """Returns the display name of the species"""
-        return dict(self.SPECIES_CHOICES).get(self.species, self.species)
\ No newline at end of file
+        return dict(self.SPECIES_CHOICES).get(self.species, self.species)
+    
+    @classmethod
+    def external_id_taken(cls, external_id, lab, exclude_pk=None):
+        """Whether another sample of the laboratory (or of no laboratory) has this external_id"""
+        if external_id is None:
+            return False
+        samples = cls.objects.filter(external_id=external_id, lab=lab)
+        if exclude_pk is not None:
+            samples = samples.exclude(pk=exclude_pk)
+        return samples.exists()
+
+
+class ImportJob(models.Model):
+    """
+    Background CSV import job
+    Created by the import page for large files and processed by
+    `manage.py run_import_worker`, which records progress as it goes
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    csv_file = models.FileField(upload_to='imports/', verbose_name="CSV File")
+    file_name = models.CharField(max_length=255, verbose_name="File Name")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Status"
+    )
+    total_bytes = models.BigIntegerField(default=0, verbose_name="Total Bytes")
+    bytes_processed = models.BigIntegerField(default=0, verbose_name="Bytes Processed")
+    rows_processed = models.IntegerField(default=0, verbose_name="Rows Processed")
+    rows_imported = models.IntegerField(default=0, verbose_name="Rows Imported")
+    rows_updated = models.IntegerField(default=0, verbose_name="Rows Updated")
+    rows_unchanged = models.IntegerField(default=0, verbose_name="Rows Unchanged")
+    rows_failed = models.IntegerField(default=0, verbose_name="Rows Failed")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Row Errors")
+    error_message = models.TextField(blank=True, verbose_name="Error Message")
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Created By",
+        related_name='import_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished At")
+    # Also set on every progress update; a running job that stops changing was left by a dead worker
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Import Job'
+        verbose_name_plural = 'Import Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Returns the progress in percent, based on the bytes read so far"""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        if not self.total_bytes:
+            return 0
+        return min(100, int(self.bytes_processed * 100 / self.total_bytes))
+
+    @property
+    def throughput(self):
+        """Returns the processed rows per second"""
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        seconds = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / seconds, 1) if seconds > 0 else None
+
+
+class IrisStatistics(models.Model):
+    """
+    Running statistics of the Iris samples per (species, laboratory)
+    Updated on every IrisPlant write (see signals.py), so the statistics
+    API reads a handful of summary rows instead of scanning the table
+    """
+    species = models.CharField(max_length=50, verbose_name="Species")
+    lab = models.ForeignKey(
+        Laboratory,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Laboratory",
+        related_name='iris_statistics'
+    )
+    count = models.IntegerField(default=0, verbose_name="Sample Count")
+    sepal_length_sum = models.FloatField(default=0, verbose_name="Sepal Length Sum")
+    sepal_length_sum_sq = models.FloatField(default=0, verbose_name="Sepal Length Sum of Squares")
+    sepal_length_min = models.FloatField(null=True, blank=True, verbose_name="Sepal Length Min")
+    sepal_length_max = models.FloatField(null=True, blank=True, verbose_name="Sepal Length Max")
+    sepal_width_sum = models.FloatField(default=0, verbose_name="Sepal Width Sum")
+    sepal_width_sum_sq = models.FloatField(default=0, verbose_name="Sepal Width Sum of Squares")
+    sepal_width_min = models.FloatField(null=True, blank=True, verbose_name="Sepal Width Min")
+    sepal_width_max = models.FloatField(null=True, blank=True, verbose_name="Sepal Width Max")
+    petal_length_sum = models.FloatField(default=0, verbose_name="Petal Length Sum")
+    petal_length_sum_sq = models.FloatField(default=0, verbose_name="Petal Length Sum of Squares")
+    petal_length_min = models.FloatField(null=True, blank=True, verbose_name="Petal Length Min")
+    petal_length_max = models.FloatField(null=True, blank=True, verbose_name="Petal Length Max")
+    petal_width_sum = models.FloatField(default=0, verbose_name="Petal Width Sum")
+    petal_width_sum_sq = models.FloatField(default=0, verbose_name="Petal Width Sum of Squares")
+    petal_width_min = models.FloatField(null=True, blank=True, verbose_name="Petal Width Min")
+    petal_width_max = models.FloatField(null=True, blank=True, verbose_name="Petal Width Max")
+
+    class Meta:
+        verbose_name = 'Iris Statistics'
+        verbose_name_plural = 'Iris Statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['species', 'lab'], name='unique_statistics_species_lab'),
+            models.UniqueConstraint(
+                fields=['species'],
+                condition=models.Q(lab__isnull=True),
+                name='unique_statistics_species_without_lab'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.species} / {self.lab_id or 'no lab'}: {self.count} samples"
@@ -0,0 +1,105 @@
+"""
+Pagination helpers.
+
+KeysetPaginator pages through a queryset ordered by (-created_at, -id)
+by seeking past the last row shown (WHERE created_at < ... ) instead of
+using OFFSET, so a deep page costs the same as the first one.
+CreatedAtCursorPagination is the REST API equivalent.
+"""
+
+import base64
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPage:
+    """One page of keyset pagination"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) paginator on (created_at, id), newest first.
+    Cursors are opaque url-safe strings built from the boundary row.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        """Return the page after (or before) the given cursor, or the first page"""
+        if before:
+            created_at, pk = decode_cursor(before)
+            queryset = self.queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+            rows = list(queryset[:self.per_page + 1])
+            has_more_before = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_more_after = True
+        else:
+            queryset = self.queryset
+            if after:
+                created_at, pk = decode_cursor(after)
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            rows = list(queryset[:self.per_page + 1])
+            has_more_after = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_more_before = bool(after)
+
+        if not rows:
+            return KeysetPage(rows, None, None)
+        return KeysetPage(
+            rows,
+            encode_cursor(rows[-1]) if has_more_after else None,
+            encode_cursor(rows[0]) if has_more_before else None,
+        )
+
+
+def encode_cursor(obj):
+    """Build a cursor string from a row's (created_at, id)"""
+    raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Parse a cursor string back into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidPage('Invalid cursor.')
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the REST API (replaces OFFSET-based page numbers).
+    Views with an OrderingFilter page in their own ordering; ordering by
+    (-created_at, -id) keeps the position unique.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,43 @@
+import codecs
+import csv
+import itertools
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .models import IrisPlant
+
+
+FEATURE_FIELDS = IrisPlant.MEASUREMENT_FIELDS
+
+
+class CSVSamplesParser(BaseParser):
+    """
+    Parses a text/csv body into {'samples': [[f1, f2, f3, f4], ...]}.
+    A header row with the feature names is optional; without it the
+    columns are read in FEATURE_FIELDS order.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = csv.reader(codecs.iterdecode(stream, encoding))
+
+        try:
+            header = next(reader, None)
+            if header is None:
+                return {'samples': []}
+
+            names = [name.strip().lower() for name in header]
+            if all(field in names for field in FEATURE_FIELDS):
+                columns = [names.index(field) for field in FEATURE_FIELDS]
+                rows = reader
+            else:
+                columns = list(range(len(FEATURE_FIELDS)))
+                rows = itertools.chain([header], reader)
+
+            return {'samples': [[row[index] for index in columns] for row in rows if row]}
+        except (UnicodeDecodeError, csv.Error, IndexError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
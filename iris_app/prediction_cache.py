@@ -0,0 +1,66 @@
+"""
+Prediction result cache for the ML prediction page.
+
+Measurements are entered with 0.1 cm resolution, so the same inputs are
+predicted over and over. Results are cached in Django's cache framework
+(IRIS_PREDICTION_CACHE alias, so it can be shared between workers) under
+a key made of the algorithm, the model version and the quantized feature
+vector. A new model version changes every key, which invalidates all old
+entries without an explicit flush.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import counters, model_registry
+
+
+HITS_KEY = 'iris:predict:hits'
+MISSES_KEY = 'iris:predict:misses'
+
+
+def get_cache():
+    """Return the cache backend used for prediction results"""
+    return caches[getattr(settings, 'IRIS_PREDICTION_CACHE', 'default')]
+
+
+def quantize(features):
+    """Round a feature vector to the cache resolution (integer steps)"""
+    step = getattr(settings, 'IRIS_PREDICTION_CACHE_STEP', 0.1)
+    return tuple(int(round(float(value) / step)) for value in features)
+
+
+def predict(algorithm, features):
+    """
+    Return (model, probabilities, cache_hit) for a single feature vector.
+    The prediction is made on the quantized vector, so cached and fresh
+    results are always identical.
+    """
+    model = model_registry.get_model(algorithm)
+    steps = quantize(features)
+    key = 'iris:predict:{}:{}:{}'.format(model.algorithm, model.version, ':'.join(map(str, steps)))
+
+    cache = get_cache()
+    probabilities = cache.get(key)
+    if probabilities is not None:
+        counters.increment(cache, HITS_KEY, 0)
+        return model, probabilities, True
+
+    step = getattr(settings, 'IRIS_PREDICTION_CACHE_STEP', 0.1)
+    probabilities = model.pipeline.predict_proba([[value * step for value in steps]])[0].tolist()
+    cache.set(key, probabilities, getattr(settings, 'IRIS_PREDICTION_CACHE_TIMEOUT', 3600))
+    counters.increment(cache, MISSES_KEY, 0)
+    return model, probabilities, False
+
+
+def get_stats():
+    """Return the hit/miss counters of the prediction cache"""
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
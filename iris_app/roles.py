@@ -0,0 +1,113 @@
+"""
+Role lookups (is the user an editor?) cached per request and per session.
+
+Membership of the 'Editor' group is read from the database once per
+login and kept in the session together with a role version. The version
+lives in the cache and is bumped by signals whenever group membership
+changes (m2m_changed on User.groups) or a group is renamed or deleted,
+so a stale session entry is detected without a database query. Within a
+request the roles are also kept on the user object.
+
+The versions are only seen by every worker when the default cache is
+shared. A session entry is therefore also re-read from the database after
+IRIS_ROLES_SESSION_TTL seconds, which bounds how long a revoked Editor
+keeps editing through a worker with a per-process (locmem) cache.
+"""
+
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db import transaction
+
+from . import counters
+
+
+EDITOR_GROUP = 'Editor'
+SESSION_KEY = '_iris_roles'
+GLOBAL_VERSION_KEY = 'iris:roles:version'
+
+Roles = namedtuple('Roles', ['is_editor', 'in_editor_group'])
+ANONYMOUS_ROLES = Roles(is_editor=False, in_editor_group=False)
+
+
+def get_roles(request):
+    """Return the Roles of request.user, using the request and session caches"""
+    return user_roles(request.user, getattr(request, 'session', None))
+
+
+def user_roles(user, session=None):
+    """
+    Return the Roles of a user, cached on the user object and, when a
+    session is given, in the session until group membership changes
+    """
+    if not user.is_authenticated:
+        return ANONYMOUS_ROLES
+    roles = getattr(user, '_iris_roles', None)
+    if roles is not None:
+        return roles
+
+    stored = session.get(SESSION_KEY) if session is not None else None
+    version = _get_version(user.pk) if session is not None else None
+    now = time.time()
+    if stored and stored.get('user') == user.pk and stored.get('version') == version and _is_fresh(stored, now):
+        in_editor_group = stored['in_editor_group']
+    else:
+        in_editor_group = user.groups.filter(name=EDITOR_GROUP).exists()
+        if session is not None:
+            session[SESSION_KEY] = {
+                'user': user.pk, 'version': version, 'in_editor_group': in_editor_group, 'checked_at': now
+            }
+
+    roles = Roles(is_editor=user.is_superuser or in_editor_group, in_editor_group=in_editor_group)
+    user._iris_roles = roles
+    return roles
+
+
+def invalidate_user_roles(user_ids):
+    """Make the cached roles of the given users stale once the transaction commits"""
+    for user_id in user_ids:
+        transaction.on_commit(lambda key=_user_version_key(user_id): _bump(key))
+
+
+def invalidate_all_roles():
+    """Make every cached role stale (e.g. a group was renamed or deleted)"""
+    transaction.on_commit(lambda: _bump(GLOBAL_VERSION_KEY))
+
+
+def editor_required(view_func, login_url='login'):
+    """View decorator: only editors (and superusers) may continue"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if get_roles(request).is_editor:
+            return view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), login_url)
+    return wrapper
+
+
+def _is_fresh(stored, now):
+    ttl = getattr(settings, 'IRIS_ROLES_SESSION_TTL', 300)
+    checked_at = stored.get('checked_at')
+    return checked_at is not None and 0 <= now - checked_at < ttl
+
+
+def _user_version_key(user_id):
+    return f'iris:roles:version:{user_id}'
+
+
+def _get_version(user_id):
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock, so a lost counter never matches an old session
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(key):
+    counters.increment(cache, key, time.time_ns())
@@ -1,10 +1,53 @@
-from rest_framework import serializers
-from .models import IrisPlant, Laboratory
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import ImportJob, IrisPlant, Laboratory
+
+
+def select_fields(request, available, expandable=()):
+    """
+    Return the names of the fields a request asks for, in `available` order:
+    ?fields=a,b,c (default: all) without the expandable fields that are
+    not named in ?expand=. Unknown names raise a ValidationError.
+    """
+    if request is None or request.method != 'GET':
+        return list(available)
+    params = request.query_params
+    expanded = {name.strip() for name in params.get('expand', '').split(',') if name.strip()}
+    unknown = expanded - set(expandable)
+    if unknown:
+        raise serializers.ValidationError({'expand': f'Unknown expansion(s): {", ".join(sorted(unknown))}'})
+    
+    requested = {name.strip() for name in params.get('fields', '').split(',') if name.strip()}
+    unknown = requested - set(available)
+    if unknown:
+        raise serializers.ValidationError({'fields': f'Unknown field(s): {", ".join(sorted(unknown))}'})
+    
+    return [
+        name for name in available
+        if (not requested or name in requested) and (name not in expandable or name in expanded)
+    ]
+
+
+class FieldsProjectionMixin:
+    """
+    Sparse fieldsets for GET requests: ?fields=a,b,c returns only those
+    fields, and Meta.expandable_fields are only included when named in
+    ?expand=
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        selected = set(select_fields(self.context.get('request'), list(self.fields), expandable))
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
 
 
 class LaboratorySerializer(serializers.ModelSerializer):
     """Laboratory model serializer"""
-    iris_count = serializers.SerializerMethodField()
+    iris_count = serializers.IntegerField(source='sample_count', read_only=True)
     
     class Meta:
         model = Laboratory
@@ -14,13 +57,9 @@ class LaboratorySerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         )
         read_only_fields = ('id', 'iris_count', 'created_at', 'updated_at')
-    
-    def get_iris_count(self, obj):
-        """Return count of iris samples in this laboratory"""
-        return obj.iris_plants.count()
 
 
-class IrisPlantSerializer(serializers.ModelSerializer):
+class IrisPlantSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     """Iris Plant model serializer with related field information"""
     
     lab_name = serializers.CharField(source='lab.name', read_only=True)
@@ -35,8 +74,9 @@ class IrisPlantSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width',
             'species', 'species_display', 'lab', 'lab_name', 'lab_city', 'lab_detail',
-            'created_by', 'created_by_username', 'created_by_fullname', 'created_at', 'updated_at'
+            'created_by', 'created_by_username', 'created_by_fullname', 'external_id', 'created_at', 'updated_at'
         )
+        expandable_fields = ('lab_detail',)
         read_only_fields = (
             'id', 'species_display', 'lab_name', 'lab_city', 'lab_detail',
             'created_by_username', 'created_by_fullname', 'created_at', 'updated_at'
@@ -72,4 +112,191 @@ class IrisPlantSerializer(serializers.ModelSerializer):
                     field_name: 'Measurement values cannot be negative.'
                 })
         
-        return data
\ No newline at end of file
+        # The unique constraint without a laboratory is partial, so the
+        # generated validators do not cover it
+        instance = self.instance
+        external_id = data['external_id'] if 'external_id' in data else getattr(instance, 'external_id', None)
+        lab = data['lab'] if 'lab' in data else getattr(instance, 'lab', None)
+        if IrisPlant.external_id_taken(external_id, lab, getattr(instance, 'pk', None)):
+            raise serializers.ValidationError({
+                'external_id': 'A sample with this external_id already exists in this laboratory.'
+                if lab is not None else 'A sample without a laboratory already has this external_id.'
+            })
+        
+        return data
+
+
+class IrisPlantBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a list of bulk items. Errors are reported per item as
+    {index: errors}; laboratories are looked up with one query for the
+    whole list. In partial (update) mode every item needs a unique id.
+    """
+    
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['Expected a non-empty list of items.']
+            })
+        
+        items, errors = {}, {}
+        for index, item in enumerate(data):
+            try:
+                items[index] = self.run_child_validation(item)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        
+        lab_ids = {item['lab'] for item in items.values() if item.get('lab') is not None}
+        labs = Laboratory.objects.in_bulk(lab_ids) if lab_ids else {}
+        seen_ids, seen_keys = set(), set()
+        for index, item in items.items():
+            item_errors = {}
+            if self.partial:
+                if item.get('id') is None:
+                    item_errors['id'] = ['This field is required.']
+                elif item['id'] in seen_ids:
+                    item_errors['id'] = ['Duplicate sample id.']
+                seen_ids.add(item.get('id'))
+            else:
+                item.pop('id', None)
+                if item.get('external_id'):
+                    key = (item.get('lab'), item['external_id'])
+                    if key in seen_keys:
+                        item_errors['external_id'] = ['Duplicate external_id for this laboratory.']
+                    seen_keys.add(key)
+            if item.get('lab') is not None and item['lab'] not in labs:
+                item_errors['lab'] = [f'Invalid pk "{item["lab"]}" - object does not exist.']
+            if item_errors:
+                errors[index] = item_errors
+            elif 'lab' in item:
+                item['lab'] = labs.get(item['lab'])
+        
+        if errors:
+            raise serializers.ValidationError(errors)
+        return list(items.values())
+
+
+class IrisPlantBulkSerializer(serializers.ModelSerializer):
+    """
+    One item of the bulk API (use with many=True). id is only used to
+    find the sample to update; lab is a laboratory id. The external_id
+    uniqueness is not validated per item: creates upsert on it.
+    """
+    id = serializers.IntegerField(required=False)
+    lab = serializers.IntegerField(required=False, allow_null=True)
+    
+    class Meta:
+        model = IrisPlant
+        fields = ('id', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'species', 'lab', 'external_id')
+        list_serializer_class = IrisPlantBulkListSerializer
+        validators = []
+
+
+class IrisPlantValuesSerializer:
+    """
+    Read-only, fast path of IrisPlantSerializer for list pages.
+    Builds the same output straight from .values() dicts (one query with
+    the needed joins, no model instances) for the fields the request
+    selected. Use values_queryset() for the rows and to_representation().
+    """
+    LAB_FIELDS = LaboratorySerializer.Meta.fields
+    # Output field -> columns it is built from
+    COLUMNS = {
+        'id': ('id',),
+        'sepal_length': ('sepal_length',),
+        'sepal_width': ('sepal_width',),
+        'petal_length': ('petal_length',),
+        'petal_width': ('petal_width',),
+        'species': ('species',),
+        'species_display': ('species',),
+        'lab': ('lab_id',),
+        'lab_name': ('lab_id', 'lab__name'),
+        'lab_city': ('lab_id', 'lab__city'),
+        'lab_detail': ('lab_id',) + tuple(
+            'lab__sample_count' if name == 'iris_count' else f'lab__{name}' for name in LAB_FIELDS
+        ),
+        'created_by': ('created_by_id',),
+        'created_by_username': ('created_by__username',),
+        'created_by_fullname': ('created_by__username', 'created_by__first_name', 'created_by__last_name'),
+        'external_id': ('external_id',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    
+    def __init__(self, request, ordering=('created_at', 'id')):
+        self.fields = select_fields(
+            request, IrisPlantSerializer.Meta.fields, IrisPlantSerializer.Meta.expandable_fields
+        )
+        # Columns used for the cursor position are always fetched
+        columns = dict.fromkeys(column.lstrip('-') for column in ordering)
+        for name in self.fields:
+            columns.update(dict.fromkeys(self.COLUMNS[name]))
+        self.columns = list(columns)
+        self.species_names = dict(IrisPlant.SPECIES_CHOICES)
+        self.datetime = serializers.DateTimeField()
+        # ISO 8601 in the current timezone, like DateTimeField, without its per-value overhead
+        self.fast_datetimes = settings.USE_TZ and str(api_settings.DATETIME_FORMAT).lower() == ISO_8601
+        self.timezone = timezone.get_current_timezone()
+    
+    def values_queryset(self, queryset):
+        return queryset.values(*self.columns)
+    
+    def to_representation(self, row):
+        data = {}
+        for name in self.fields:
+            if name == 'species_display':
+                data[name] = self.species_names.get(row['species'], row['species'])
+            elif name == 'lab':
+                data[name] = row['lab_id']
+            elif name in ('lab_name', 'lab_city'):
+                # Omitted without a laboratory, like the model serializer does
+                if row['lab_id'] is not None:
+                    data[name] = row[f'lab__{name[4:]}']
+            elif name == 'lab_detail':
+                data[name] = self.lab_representation(row) if row['lab_id'] is not None else None
+            elif name == 'created_by':
+                data[name] = row['created_by_id']
+            elif name == 'created_by_username':
+                data[name] = row['created_by__username']
+            elif name == 'created_by_fullname':
+                first_name, last_name = row['created_by__first_name'], row['created_by__last_name']
+                data[name] = f"{first_name} {last_name}" if first_name and last_name else row['created_by__username']
+            elif name in ('created_at', 'updated_at'):
+                data[name] = self.format_datetime(row[name])
+            else:
+                data[name] = row[name]
+        return data
+    
+    def format_datetime(self, value):
+        if not value or not self.fast_datetimes:
+            return self.datetime.to_representation(value)
+        value = value.astimezone(self.timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    
+    def lab_representation(self, row):
+        data = {}
+        for name in self.LAB_FIELDS:
+            if name == 'iris_count':
+                data[name] = row['lab__sample_count']
+            elif name in ('created_at', 'updated_at'):
+                data[name] = self.format_datetime(row[f'lab__{name}'])
+            else:
+                data[name] = row[f'lab__{name}']
+        return data
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """Background import job serializer (read-only, used for progress polling)"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+    throughput = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = ImportJob
+        fields = (
+            'id', 'file_name', 'status', 'status_display', 'progress', 'throughput',
+            'total_bytes', 'bytes_processed', 'rows_processed', 'rows_imported', 'rows_updated',
+            'rows_unchanged', 'rows_failed',
+            'errors', 'error_message', 'created_at', 'started_at', 'finished_at'
+        )
+        read_only_fields = fields
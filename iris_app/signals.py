@@ -0,0 +1,204 @@
+"""
+Keeps the denormalized summaries in sync with the IrisPlant table:
+Laboratory.sample_count and the IrisStatistics rows.
+
+Single saves and deletes are handled by the receivers below. Inside
+batched_summary_updates() the changes are collected and written once
+per laboratory / statistics group, which is what bulk deletes use.
+bulk_create and bulk_update send no signals, so bulk writes call
+apply_bulk_insert_summaries() / apply_bulk_update_summaries()
+themselves. `manage.py recount_lab_samples` and
+`manage.py rebuild_statistics` verify and repair the summaries.
+Every change also bumps the dataset generation of dataset_cache.
+
+The receivers at the end keep the cached user roles (roles.py) in sync
+with group membership.
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import dataset_cache, roles, summary
+from .models import IrisPlant, Laboratory
+
+
+_pending = threading.local()
+
+TRACKED_FIELDS = ('lab_id', 'species') + summary.MEASUREMENT_FIELDS
+
+
+def apply_sample_count_deltas(deltas):
+    """Apply {lab_id: delta} to the stored counters with atomic F() updates"""
+    for lab_id, delta in deltas.items():
+        if lab_id is not None and delta:
+            Laboratory.objects.filter(pk=lab_id).update(sample_count=F('sample_count') + delta)
+
+
+def apply_bulk_insert_summaries(plants):
+    """Update the counters and statistics for rows inserted with bulk_create"""
+    statistics = {}
+    for plant in plants:
+        summary.collect(statistics, plant.species, plant.lab_id, summary.measurements(plant))
+    apply_sample_count_deltas(Counter(plant.lab_id for plant in plants))
+    summary.apply_statistics_deltas(statistics)
+    _dataset_changed()
+
+
+def apply_bulk_update_summaries(changes):
+    """
+    Update the counters and statistics for rows changed with bulk_update;
+    changes are (previous values dict, saved plant) pairs
+    """
+    with batched_summary_updates():
+        for previous, plant in changes:
+            current = {field: getattr(plant, field) for field in TRACKED_FIELDS}
+            if previous != current:
+                _record(previous['species'], previous['lab_id'], summary.measurements(previous), -1)
+                _record(plant.species, plant.lab_id, summary.measurements(plant), 1)
+        _dataset_changed()
+
+
+@contextmanager
+def batched_summary_updates():
+    """Collect summary changes and write them once per group on exit"""
+    if getattr(_pending, 'counts', None) is not None:
+        # Already batching in an outer block
+        yield
+        return
+
+    _pending.counts = Counter()
+    _pending.statistics = {}
+    _pending.changed = False
+    try:
+        with transaction.atomic():
+            yield
+            apply_sample_count_deltas(_pending.counts)
+            summary.apply_statistics_deltas(_pending.statistics)
+            if _pending.changed:
+                dataset_cache.bump_generation()
+    finally:
+        _pending.counts = None
+        _pending.statistics = None
+        _pending.changed = False
+
+
+def _dataset_changed():
+    """Bump the dataset generation, once per batch when batching"""
+    if getattr(_pending, 'counts', None) is not None:
+        _pending.changed = True
+    else:
+        dataset_cache.bump_generation()
+
+
+def _record(species, lab_id, values, sign):
+    counts = getattr(_pending, 'counts', None)
+    if counts is not None:
+        if lab_id is not None:
+            counts[lab_id] += sign
+        summary.collect(_pending.statistics, species, lab_id, values, sign)
+        return
+
+    statistics = {}
+    summary.collect(statistics, species, lab_id, values, sign)
+    apply_sample_count_deltas({lab_id: sign})
+    summary.apply_statistics_deltas(statistics)
+
+
+@receiver(pre_save, sender=IrisPlant)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    """Remember the stored values of an existing sample to detect changes"""
+    if raw or instance._state.adding or instance.pk is None:
+        instance._previous_values = None
+        return
+    instance._previous_values = (
+        IrisPlant.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=IrisPlant)
+def update_summaries_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_values', None)
+    current = {field: getattr(instance, field) for field in TRACKED_FIELDS}
+    instance._previous_values = current
+    _dataset_changed()
+
+    if previous == current:
+        return
+    with batched_summary_updates():
+        if previous is not None:
+            _record(previous['species'], previous['lab_id'], summary.measurements(previous), -1)
+        _record(instance.species, instance.lab_id, summary.measurements(instance), 1)
+
+
+@receiver(post_delete, sender=IrisPlant)
+def update_summaries_on_delete(sender, instance, **kwargs):
+    _record(instance.species, instance.lab_id, summary.measurements(instance), -1)
+    _dataset_changed()
+
+
+@receiver(post_save, sender=Laboratory)
+def laboratory_changed(sender, instance, raw=False, **kwargs):
+    # Laboratory names are part of the statistics
+    if not raw:
+        _dataset_changed()
+
+
+@receiver(pre_delete, sender=Laboratory)
+def clear_external_ids_of_deleted_lab(sender, instance, **kwargs):
+    """
+    external_id is unique per laboratory. The samples of a deleted
+    laboratory move to no laboratory, where the same ids may already be
+    taken (e.g. by the samples of another deleted laboratory), so their
+    ids are cleared before SET_NULL runs.
+    """
+    IrisPlant.objects.filter(lab=instance, external_id__isnull=False).update(external_id=None)
+
+
+@receiver(post_delete, sender=Laboratory)
+def move_statistics_of_deleted_lab(sender, instance, **kwargs):
+    """
+    Samples of a deleted laboratory are set to no laboratory by SQL,
+    without signals; rebuild the no-laboratory statistics groups.
+    """
+    summary.rebuild_statistics(lab_id=None)
+    _dataset_changed()
+
+
+@receiver(user_logged_in)
+def load_roles_on_login(sender, request, user, **kwargs):
+    """Read the roles once per login and keep them in the session"""
+    if request is not None and hasattr(request, 'session'):
+        roles.user_roles(user, request.session)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        roles.invalidate_user_roles([instance.pk])
+    elif pk_set:
+        # group.user_set.add/remove(...)
+        roles.invalidate_user_roles(pk_set)
+    else:
+        # group.user_set.clear(): the users are no longer known
+        roles.invalidate_all_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, raw=False, **kwargs):
+    # A rename or delete can change who is in the 'Editor' group
+    if not raw:
+        roles.invalidate_all_roles()
@@ -0,0 +1,298 @@
+"""
+In-memory nearest-neighbour index over the Iris measurements.
+
+The index keeps the ids, the 4-D feature vectors, the species codes and
+the laboratory ids of all samples in NumPy arrays (one per process).
+Queries are brute-force distance computations over the arrays (one
+matrix product for a whole batch of query points), which keeps
+species/laboratory filtering exact and needs no tree rebuild.
+
+The index is kept in sync with the dataset generation (see
+dataset_cache): when it changed, only the rows updated since the last
+sync are fetched, deleted rows are dropped and laboratories that no
+longer exist are cleared, into a new index that replaces the old one.
+Nothing is reloaded per request.
+"""
+
+import copy
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+
+from . import dataset_cache
+from .models import IrisPlant, Laboratory
+
+
+FEATURE_FIELDS = IrisPlant.MEASUREMENT_FIELDS
+SPECIES_CODES = [code for code, name in IrisPlant.SPECIES_CHOICES]
+METRICS = ('euclidean', 'manhattan', 'chebyshev', 'cosine')
+DEFAULT_METRIC = 'euclidean'
+# Re-read rows saved slightly before the last sync, in case their
+# transaction committed after it
+SYNC_MARGIN = timedelta(seconds=60)
+# Largest query points x samples score matrix computed at once
+QUERY_BLOCK_SIZE = 4 * 1024 * 1024
+
+_lock = threading.Lock()
+_index = None
+
+
+class SimilarityIndex:
+    """
+    Sorted-by-id NumPy arrays of every sample.
+    An index is never modified once built: syncing builds a new one and
+    swaps the process-wide reference, so a query keeps a consistent
+    snapshot even while another thread syncs.
+    """
+
+    def __init__(self, np, ids=None, features=None, species=None, lab_ids=None):
+        self.np = np
+        self.ids = np.empty(0, dtype=np.int64) if ids is None else ids
+        self.features = np.empty((0, len(FEATURE_FIELDS)), dtype=np.float64) if features is None else features
+        self.species = np.empty(0, dtype=np.int8) if species is None else species
+        self.lab_ids = np.empty(0, dtype=np.int64) if lab_ids is None else lab_ids
+        self._prepare()
+        for array in (self.ids, self.features, self.species, self.lab_ids, self.columns, self.squared_norms):
+            array.flags.writeable = False
+        self.generation = None
+        self.synced_at = None
+        self.checked_at = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, rows):
+        """Return a new index with the (id, *features, species, lab_id) rows inserted or replaced"""
+        np = self.np
+        if not rows:
+            return self
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        features = np.array([row[1:5] for row in rows], dtype=np.float64).reshape(len(rows), len(FEATURE_FIELDS))
+        species_index = {code: index for index, code in enumerate(SPECIES_CODES)}
+        species = np.fromiter((species_index.get(row[5], -1) for row in rows), dtype=np.int8, count=len(rows))
+        lab_ids = np.fromiter((row[6] if row[6] is not None else -1 for row in rows), dtype=np.int64, count=len(rows))
+
+        positions = np.searchsorted(self.ids, ids)
+        existing = positions < len(self.ids)
+        existing[existing] = self.ids[positions[existing]] == ids[existing]
+        new_features = self.features.copy()
+        new_species = self.species.copy()
+        new_lab_ids = self.lab_ids.copy()
+        new_features[positions[existing]] = features[existing]
+        new_species[positions[existing]] = species[existing]
+        new_lab_ids[positions[existing]] = lab_ids[existing]
+        new_ids = self.ids
+
+        new = ~existing
+        if new.any():
+            new_ids = np.concatenate([new_ids, ids[new]])
+            order = np.argsort(new_ids, kind='stable')
+            new_ids = new_ids[order]
+            new_features = np.concatenate([new_features, features[new]])[order]
+            new_species = np.concatenate([new_species, species[new]])[order]
+            new_lab_ids = np.concatenate([new_lab_ids, lab_ids[new]])[order]
+        return SimilarityIndex(np, new_ids, new_features, new_species, new_lab_ids)
+
+    def keep(self, mask):
+        """Return a new index without the rows where mask is False"""
+        return SimilarityIndex(
+            self.np, self.ids[mask], self.features[mask], self.species[mask], self.lab_ids[mask]
+        )
+
+    def clear_labs(self, lab_ids):
+        """Return a new index where laboratories not in lab_ids are cleared"""
+        np = self.np
+        missing = ~np.isin(self.lab_ids, lab_ids)
+        if not missing.any():
+            return self
+        new_lab_ids = self.lab_ids.copy()
+        new_lab_ids[missing] = -1
+        return SimilarityIndex(np, self.ids, self.features, self.species, new_lab_ids)
+
+    def _prepare(self):
+        # Feature-major copy and norms used by the distance kernels
+        self.columns = self.np.ascontiguousarray(self.features.T)
+        self.squared_norms = self.np.einsum('ij,ij->i', self.features, self.features)
+
+    def position(self, sample_id):
+        """Return the row position of a sample id, or None"""
+        position = int(self.np.searchsorted(self.ids, sample_id))
+        if position < len(self.ids) and self.ids[position] == sample_id:
+            return position
+        return None
+
+    def query(self, points, k=10, metric=DEFAULT_METRIC, species=None, lab_id=None, exclude_ids=()):
+        """
+        Find the k nearest samples of every query point.
+        Returns (positions, distances), two arrays of shape (len(points), k)
+        (k is capped at the number of candidates), nearest first.
+        species is a species code; lab_id=0 selects samples without a lab.
+        """
+        np = self.np
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(FEATURE_FIELDS))
+
+        mask = None
+        if species is not None:
+            mask = self.species == SPECIES_CODES.index(species)
+        if lab_id is not None:
+            lab_mask = self.lab_ids == (lab_id or -1)
+            mask = lab_mask if mask is None else mask & lab_mask
+        if len(exclude_ids):
+            exclude_mask = ~np.isin(self.ids, np.asarray(list(exclude_ids), dtype=np.int64))
+            mask = exclude_mask if mask is None else mask & exclude_mask
+
+        if mask is None:
+            candidates = np.arange(len(self.ids))
+            columns, squared_norms = self.columns, self.squared_norms
+        else:
+            candidates = np.flatnonzero(mask)
+            columns, squared_norms = self.columns[:, candidates], self.squared_norms[candidates]
+
+        k = min(k, len(candidates))
+        positions = np.empty((len(points), k), dtype=np.int64)
+        distances = np.empty((len(points), k), dtype=np.float64)
+        if not k:
+            return positions, distances
+
+        # One score matrix per block of query points, bounded in size
+        block = max(1, QUERY_BLOCK_SIZE // len(candidates))
+        for start in range(0, len(points), block):
+            block_points = points[start:start + block]
+            scores = _scores(np, block_points, columns, squared_norms, metric)
+            if k < len(candidates):
+                nearest = np.argpartition(scores, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(len(candidates)), scores.shape)
+            # Sorted columns first, so equal distances stay ordered by id
+            nearest = candidates[np.sort(nearest, axis=1)]
+            nearest_distances = _distances(np, block_points, self.features[nearest], metric)
+            order = np.argsort(nearest_distances, axis=1, kind='stable')
+            positions[start:start + block] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + block] = np.take_along_axis(nearest_distances, order, axis=1)
+        return positions, distances
+
+    def nearest(self, points, **options):
+        """
+        Neighbour dicts of every query point (see query() for the options).
+        Positions are only valid in the index that returned them, so
+        callers should use this instead of mixing query() and describe()
+        of indexes fetched separately.
+        """
+        positions, distances = self.query(points, **options)
+        return [
+            self.describe(row_positions, row_distances)
+            for row_positions, row_distances in zip(positions, distances)
+        ]
+
+    def describe(self, positions, distances):
+        """Build neighbour dicts (id, measurements, species, lab, distance) from the index"""
+        return [
+            {
+                'id': int(self.ids[position]),
+                **dict(zip(FEATURE_FIELDS, self.features[position].tolist())),
+                'species': SPECIES_CODES[self.species[position]] if self.species[position] >= 0 else None,
+                'lab': int(self.lab_ids[position]) if self.lab_ids[position] >= 0 else None,
+                'distance': float(distance),
+            }
+            for position, distance in zip(positions, distances)
+        ]
+
+
+def get_index():
+    """
+    Return the process-wide index, synced with the current dataset generation.
+    The generation lives in the default cache; with a per-process cache
+    (locmem) writes made by other workers do not bump it, so the database
+    is also re-checked every IRIS_SIMILARITY_RESYNC_INTERVAL seconds.
+    """
+    global _index
+    import numpy as np
+
+    generation = dataset_cache.get_generation()
+    interval = getattr(settings, 'IRIS_SIMILARITY_RESYNC_INTERVAL', 60)
+    with _lock:
+        index = _index if _index is not None else SimilarityIndex(np)
+        if index.generation != generation or time.monotonic() - index.checked_at >= interval:
+            _index = _sync(index, generation)
+        return _index
+
+
+def clear_index():
+    """Forget the index; the next query loads it again"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def _sync(index, generation):
+    """Return a new index with the changes made since index was synced"""
+    np = index.np
+    checked_at = time.monotonic()
+    plants = IrisPlant.objects.order_by()
+    synced_at = plants.aggregate(latest=Max('updated_at'))['latest']
+
+    # Rows inserted or changed since the last sync (all rows the first time)
+    changed = plants
+    if index.synced_at is not None:
+        changed = plants.filter(updated_at__gte=index.synced_at - SYNC_MARGIN)
+    new_index = index.upsert(list(changed.values_list('id', *FEATURE_FIELDS, 'species', 'lab_id')))
+
+    if index.synced_at is not None:
+        if plants.count() != len(new_index):
+            existing = list(plants.values_list('id', flat=True).iterator())
+            new_index = new_index.keep(np.isin(new_index.ids, np.asarray(existing, dtype=np.int64)))
+        # Deleting a laboratory clears lab_id in SQL without touching updated_at
+        new_index = new_index.clear_labs(
+            np.asarray(list(Laboratory.objects.values_list('id', flat=True)), dtype=np.int64)
+        )
+
+    if new_index is index:
+        # Nothing changed; the arrays are read-only, so they can be shared
+        new_index = copy.copy(index)
+    new_index.synced_at = synced_at
+    new_index.generation = generation
+    new_index.checked_at = checked_at
+    return new_index
+
+
+def _scores(np, points, columns, squared_norms, metric):
+    """
+    Matrix of shape (len(points), len(samples)) ordered like the distances.
+    Euclidean uses |p|^2 + |f|^2 - 2 p.f (one matrix product); the exact
+    distances of the selected neighbours are computed by _distances.
+    """
+    if metric == 'cosine':
+        products = points @ columns
+        norms = np.outer(np.linalg.norm(points, axis=1), np.sqrt(squared_norms))
+        return -np.divide(products, norms, out=np.zeros(products.shape), where=norms > 0)
+    if metric in ('manhattan', 'chebyshev'):
+        scores = np.abs(points[:, :1] - columns[0])
+        for index in range(1, len(columns)):
+            difference = np.abs(points[:, index:index + 1] - columns[index])
+            if metric == 'manhattan':
+                scores += difference
+            else:
+                np.maximum(scores, difference, out=scores)
+        return scores
+    scores = points @ columns
+    scores *= -2
+    scores += squared_norms
+    scores += np.einsum('ij,ij->i', points, points)[:, None]
+    return scores
+
+
+def _distances(np, points, neighbours, metric):
+    """Exact distances between points (n x 4) and their neighbours (n x k x 4)"""
+    if metric == 'cosine':
+        products = np.einsum('ik,ijk->ij', points, neighbours)
+        norms = np.linalg.norm(points, axis=1)[:, None] * np.linalg.norm(neighbours, axis=2)
+        return 1.0 - np.divide(products, norms, out=np.zeros(products.shape), where=norms > 0)
+    difference = neighbours - points[:, None, :]
+    if metric == 'manhattan':
+        return np.abs(difference).sum(axis=2)
+    if metric == 'chebyshev':
+        return np.abs(difference).max(axis=2)
+    return np.sqrt(np.einsum('ijk,ijk->ij', difference, difference))
@@ -0,0 +1,51 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets the PRAGMAs configured in settings
+(IRIS_SQLITE_*): WAL journal mode so readers do not block behind
+writers, synchronous, page cache and memory-map sizes and a busy
+timeout. Connections are reused between requests with CONN_MAX_AGE, so
+this runs once per connection, not per request.
+
+The journal mode is stored in the database file. An empty
+IRIS_SQLITE_JOURNAL_MODE (the default of manage.py) keeps the mode the
+file has, so management commands do not modify the file.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+SYNCHRONOUS_MODES = ('off', 'normal', 'full', 'extra')
+
+
+def get_pragmas():
+    """Return the configured (name, value) PRAGMAs, validated"""
+    journal_mode = str(getattr(settings, 'IRIS_SQLITE_JOURNAL_MODE', 'wal') or '').lower()
+    if journal_mode and journal_mode not in JOURNAL_MODES:
+        raise ImproperlyConfigured(f'IRIS_SQLITE_JOURNAL_MODE must be empty or one of: {", ".join(JOURNAL_MODES)}')
+    synchronous = str(getattr(settings, 'IRIS_SQLITE_SYNCHRONOUS', 'normal')).lower()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ImproperlyConfigured(f'IRIS_SQLITE_SYNCHRONOUS must be one of: {", ".join(SYNCHRONOUS_MODES)}')
+
+    pragmas = [('journal_mode', journal_mode)] if journal_mode else []
+    return pragmas + [
+        ('synchronous', synchronous),
+        ('cache_size', int(getattr(settings, 'IRIS_SQLITE_CACHE_SIZE', -64000))),
+        ('mmap_size', int(getattr(settings, 'IRIS_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('busy_timeout', int(getattr(settings, 'IRIS_SQLITE_BUSY_TIMEOUT', 5000))),
+    ]
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Apply the PRAGMAs to a new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_pragmas():
+            # In-memory databases (tests) keep journal_mode=memory
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,219 @@
+"""
+Incrementally maintained statistics of the Iris samples.
+
+IrisStatistics keeps count, sum, sum of squares, min and max of every
+measurement per (species, laboratory). Writes are turned into
+StatisticsDelta objects and applied with F() updates. Min and max
+cannot be "un-done", so when a removed value was the group's min or max
+only that group is re-aggregated. The statistics API then combines the
+few summary rows in Python, whatever the size of the IrisPlant table.
+"""
+
+import math
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Greatest, Least
+
+from .models import IrisPlant, IrisStatistics
+
+
+MEASUREMENT_FIELDS = IrisPlant.MEASUREMENT_FIELDS
+
+
+class StatisticsDelta:
+    """Pending change of one (species, lab) group"""
+
+    def __init__(self):
+        self.count = 0
+        self.sums = [0.0] * len(MEASUREMENT_FIELDS)
+        self.sums_sq = [0.0] * len(MEASUREMENT_FIELDS)
+        self.added_min = [None] * len(MEASUREMENT_FIELDS)
+        self.added_max = [None] * len(MEASUREMENT_FIELDS)
+        self.removed_min = [None] * len(MEASUREMENT_FIELDS)
+        self.removed_max = [None] * len(MEASUREMENT_FIELDS)
+
+    def add(self, values, sign=1):
+        """Add (sign=1) or remove (sign=-1) one sample's measurements"""
+        self.count += sign
+        lows, highs = (self.added_min, self.added_max) if sign > 0 else (self.removed_min, self.removed_max)
+        for index, value in enumerate(values):
+            self.sums[index] += sign * value
+            self.sums_sq[index] += sign * value * value
+            lows[index] = value if lows[index] is None else min(lows[index], value)
+            highs[index] = value if highs[index] is None else max(highs[index], value)
+
+    @property
+    def has_additions(self):
+        return self.added_min[0] is not None
+
+    @property
+    def has_removals(self):
+        return self.removed_min[0] is not None
+
+
+def measurements(values):
+    """Return the measurement tuple of a sample (model instance or dict)"""
+    if isinstance(values, dict):
+        return tuple(values[field] for field in MEASUREMENT_FIELDS)
+    return tuple(getattr(values, field) for field in MEASUREMENT_FIELDS)
+
+
+def collect(deltas, species, lab_id, values, sign=1):
+    """Record a sample added to (sign=1) or removed from (sign=-1) a group"""
+    key = (species, lab_id)
+    if key not in deltas:
+        deltas[key] = StatisticsDelta()
+    deltas[key].add(values, sign)
+
+
+def apply_statistics_deltas(deltas):
+    """Write {(species, lab_id): StatisticsDelta} to the summary table"""
+    for (species, lab_id), delta in deltas.items():
+        if delta.has_additions or delta.has_removals:
+            _apply_delta(species, lab_id, delta)
+
+
+def rebuild_statistics(species=None, lab_id=None, all_groups=False):
+    """
+    Recompute summary rows from the IrisPlant table.
+    Either every group (all_groups=True), or the groups matching species
+    and/or lab_id (lab_id=None means samples without a laboratory).
+    """
+    plants = IrisPlant.objects.order_by()
+    groups = IrisStatistics.objects.all()
+    if not all_groups:
+        plants = plants.filter(lab_id=lab_id)
+        groups = groups.filter(lab_id=lab_id)
+        if species is not None:
+            plants = plants.filter(species=species)
+            groups = groups.filter(species=species)
+
+    aggregates = {'count': Count('id')}
+    for field in MEASUREMENT_FIELDS:
+        aggregates[f'{field}_sum'] = Sum(field)
+        aggregates[f'{field}_sum_sq'] = Sum(F(field) * F(field))
+        aggregates[f'{field}_min'] = Min(field)
+        aggregates[f'{field}_max'] = Max(field)
+
+    with transaction.atomic():
+        groups.delete()
+        IrisStatistics.objects.bulk_create([
+            IrisStatistics(**row)
+            for row in plants.values('species', 'lab_id').annotate(**aggregates)
+        ])
+
+
+def get_statistics():
+    """Return the statistics API payload, computed from the summary rows"""
+    rows = list(IrisStatistics.objects.select_related('lab').filter(count__gt=0))
+
+    species_groups = defaultdict(list)
+    lab_groups = defaultdict(list)
+    for row in rows:
+        species_groups[row.species].append(row)
+        lab_groups[row.lab.name if row.lab else None].append(row)
+
+    total = _combine(rows)
+    total_statistics = {'total_samples': total['count']}
+    for field in MEASUREMENT_FIELDS:
+        total_statistics[f'avg_{field}'] = total[field]['avg']
+    for field in MEASUREMENT_FIELDS:
+        total_statistics[f'min_{field}'] = total[field]['min']
+        total_statistics[f'max_{field}'] = total[field]['max']
+    for field in MEASUREMENT_FIELDS:
+        total_statistics[f'variance_{field}'] = total[field]['variance']
+        total_statistics[f'std_{field}'] = total[field]['std']
+
+    species_distribution = []
+    for species, group in sorted(species_groups.items()):
+        combined = _combine(group)
+        entry = {'species': species, 'count': combined['count']}
+        for field in MEASUREMENT_FIELDS:
+            entry[f'avg_{field}'] = combined[field]['avg']
+            entry[f'std_{field}'] = combined[field]['std']
+        species_distribution.append(entry)
+
+    laboratory_distribution = sorted(
+        ({'lab__name': name, 'count': sum(row.count for row in group)} for name, group in lab_groups.items()),
+        key=lambda entry: -entry['count']
+    )
+
+    return {
+        'total_statistics': total_statistics,
+        'species_distribution': species_distribution,
+        'laboratory_distribution': laboratory_distribution,
+    }
+
+
+def _combine(rows):
+    """Combine summary rows into count plus avg/min/max/variance/std per field"""
+    count = sum(row.count for row in rows)
+    combined = {'count': count}
+    for field in MEASUREMENT_FIELDS:
+        total = sum(getattr(row, f'{field}_sum') for row in rows)
+        total_sq = sum(getattr(row, f'{field}_sum_sq') for row in rows)
+        lows = [getattr(row, f'{field}_min') for row in rows if getattr(row, f'{field}_min') is not None]
+        highs = [getattr(row, f'{field}_max') for row in rows if getattr(row, f'{field}_max') is not None]
+
+        variance = None
+        if count > 1:
+            # Sample variance; clamp the tiny negatives float rounding can produce
+            variance = max(0.0, (total_sq - total * total / count) / (count - 1))
+        combined[field] = {
+            'avg': total / count if count else None,
+            'min': min(lows) if lows else None,
+            'max': max(highs) if highs else None,
+            'variance': variance,
+            'std': math.sqrt(variance) if variance is not None else None,
+        }
+    return combined
+
+
+def _apply_delta(species, lab_id, delta):
+    group = IrisStatistics.objects.filter(species=species, lab_id=lab_id)
+    changes = {'count': F('count') + delta.count}
+    for index, field in enumerate(MEASUREMENT_FIELDS):
+        changes[f'{field}_sum'] = F(f'{field}_sum') + delta.sums[index]
+        changes[f'{field}_sum_sq'] = F(f'{field}_sum_sq') + delta.sums_sq[index]
+        if delta.has_additions:
+            changes[f'{field}_min'] = Least(F(f'{field}_min'), delta.added_min[index])
+            changes[f'{field}_max'] = Greatest(F(f'{field}_max'), delta.added_max[index])
+
+    with transaction.atomic():
+        if not group.update(**changes):
+            if delta.has_removals:
+                # Removing from a group we never summarized: start from the table
+                rebuild_statistics(species=species, lab_id=lab_id)
+                return
+            try:
+                with transaction.atomic():
+                    IrisStatistics.objects.create(species=species, lab_id=lab_id, **_initial_values(delta))
+            except IntegrityError:
+                # Created concurrently by another writer
+                group.update(**changes)
+
+        if delta.has_removals:
+            row = group.first()
+            if row is None:
+                return
+            if row.count <= 0:
+                row.delete()
+            elif any(
+                delta.removed_min[index] <= getattr(row, f'{field}_min')
+                or delta.removed_max[index] >= getattr(row, f'{field}_max')
+                for index, field in enumerate(MEASUREMENT_FIELDS)
+            ):
+                # A removed value was the min or max: re-aggregate just this group
+                rebuild_statistics(species=species, lab_id=lab_id)
+
+
+def _initial_values(delta):
+    values = {'count': delta.count}
+    for index, field in enumerate(MEASUREMENT_FIELDS):
+        values[f'{field}_sum'] = delta.sums[index]
+        values[f'{field}_sum_sq'] = delta.sums_sq[index]
+        values[f'{field}_min'] = delta.added_min[index]
+        values[f'{field}_max'] = delta.added_max[index]
+    return values
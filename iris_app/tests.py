@@ -1,3 +1,1542 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import pickle
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from contextlib import closing
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
\ No newline at end of file
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models import Avg, Count, Max, Min
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import dataset_cache, exporters, importers, model_registry, prediction_cache, similarity, sqlite
+from .models import ImportJob, IrisPlant, IrisStatistics, Laboratory
+from .pagination import KeysetPaginator
+from .serializers import IrisPlantSerializer
+from .signals import apply_bulk_insert_summaries, batched_summary_updates
+from .viewset import IrisViewSet
+
+
+def create_samples(user, labs, count):
+    """Create `count` iris samples spread over the given laboratories"""
+    plants = IrisPlant.objects.bulk_create([
+        IrisPlant(
+            sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2,
+            species='setosa', lab=labs[index % len(labs)], created_by=user
+        )
+        for index in range(count)
+    ])
+    apply_bulk_insert_summaries(plants)
+    return plants
+
+
+def encode_text(text):
+    """url-safe base64 without padding, the cursor encoding"""
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+def use_temporary_model_dir(test_case):
+    """Store the models of a test in a temporary IRIS_MODEL_DIR"""
+    model_dir = tempfile.TemporaryDirectory()
+    test_case.addCleanup(model_dir.cleanup)
+    settings_override = override_settings(IRIS_MODEL_DIR=Path(model_dir.name))
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    model_registry.clear_cache()
+    test_case.addCleanup(model_registry.clear_cache)
+
+
+class ModelRegistryTests(TestCase):
+    """Models are trained once, cached, and reloaded when their file changes"""
+
+    def setUp(self):
+        use_temporary_model_dir(self)
+
+    def test_first_use_trains_and_caches(self):
+        model = model_registry.get_model('logistic')
+        self.assertTrue(model_registry.get_model_path('logistic').exists())
+        self.assertIs(model_registry.get_model('logistic'), model)
+        self.assertFalse(model_registry.is_stale('logistic'))
+
+    def test_new_model_file_is_picked_up(self):
+        model = model_registry.get_model('logistic')
+        # Another worker (or `manage.py train_iris_models`) publishes a new file
+        path = model_registry.get_model_path('logistic')
+        with open(path, 'rb') as model_file:
+            payload = pickle.load(model_file)
+        payload['version'] = 'published'
+        model_registry._write_atomic(path, pickle.dumps(payload))
+
+        reloaded = model_registry.get_model('logistic')
+        self.assertEqual(reloaded.version, 'published')
+        self.assertNotEqual(reloaded.version, model.version)
+        self.assertIs(model_registry.get_model('logistic'), reloaded)
+
+
+class TrainingDataTests(TestCase):
+    """Models are trained on the IrisPlant table once it has enough labelled rows"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('trainer', password='secret')
+
+    def create_training_rows(self, count):
+        IrisPlant.objects.bulk_create([
+            IrisPlant(
+                sepal_length=5.0 + index % 3, sepal_width=3.0, petal_length=1.0 + 2 * (index % 3),
+                petal_width=0.2 + index % 3, species=IrisPlant.SPECIES_CHOICES[index % 3][0], created_by=self.user
+            )
+            for index in range(count)
+        ])
+
+    @override_settings(IRIS_MODEL_MIN_SAMPLES=30)
+    def test_bundled_dataset_until_the_table_is_large_enough(self):
+        self.create_training_rows(29)
+        self.assertEqual(len(model_registry.load_training_data().y), 150)
+
+        self.create_training_rows(1)
+        data = model_registry.load_training_data()
+        self.assertEqual(data.X.shape, (30, 4))
+        self.assertEqual(data.classes, ['setosa', 'versicolor', 'virginica'])
+        self.assertEqual(data.y.tolist()[:3], [0, 1, 2])
+
+    def test_data_signature_changes_on_every_write(self):
+        self.create_training_rows(3)
+        signature = model_registry.get_data_signature()
+        plant = IrisPlant.objects.first()
+        plant.petal_width = 9.0
+        plant.save()
+        updated = model_registry.get_data_signature()
+        self.assertNotEqual(updated, signature)
+        plant.delete()
+        self.assertNotEqual(model_registry.get_data_signature(), updated)
+
+
+class PredictBatchTests(TestCase):
+    """predict/batch/ returns the same results whether streamed or not"""
+
+    samples = [[5.1, 3.5, 1.4, 0.2], [6.2, 2.9, 4.3, 1.3], [7.7, 3.0, 6.1, 2.3], [5.0, 3.4, 1.5, 0.2], [6.0, 2.2, 5.0, 1.5]]
+
+    def setUp(self):
+        use_temporary_model_dir(self)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('predictor', password='secret'))
+        self.url = '/api/iris/predict/batch/'
+
+    def test_streamed_results_match(self):
+        response = self.client.post(self.url, {'algorithm': 'knn', 'samples': self.samples}, format='json')
+        self.assertEqual(response.status_code, 200)
+        expected = response.json()
+
+        with override_settings(IRIS_PREDICT_CHUNK_SIZE=2):
+            response = self.client.post(self.url, {'algorithm': 'knn', 'samples': self.samples}, format='json')
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(streamed, expected)
+        self.assertEqual(streamed['count'], 5)
+        self.assertEqual(streamed['results'][0]['species'], 'setosa')
+
+    def test_csv_body(self):
+        body = 'sepal_length,sepal_width,petal_length,petal_width\n' + '\n'.join(
+            ','.join(map(str, sample)) for sample in self.samples
+        )
+        response = self.client.post(self.url + '?algorithm=knn', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_invalid_requests(self):
+        for body in (
+            {'algorithm': ['knn'], 'samples': self.samples},
+            {'algorithm': 'unknown', 'samples': self.samples},
+            {'samples': []},
+            {'samples': [[1, 2, 3]]},
+            {'samples': [[1, 2, 3, 'x']]},
+        ):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class PredictionCacheTests(TestCase):
+    """Predictions are cached per model version and quantized input"""
+
+    def setUp(self):
+        use_temporary_model_dir(self)
+        prediction_cache.get_cache().clear()
+
+    def test_hits_and_new_model_versions(self):
+        model, probabilities, hit = prediction_cache.predict('logistic', [5.1, 3.5, 1.4, 0.2])
+        self.assertFalse(hit)
+        # Same vector after rounding to 0.1 cm
+        cached_model, cached, hit = prediction_cache.predict('logistic', [5.12, 3.48, 1.4, 0.2])
+        self.assertTrue(hit)
+        self.assertEqual(cached, probabilities)
+        self.assertEqual(prediction_cache.get_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+        # A retrained model has a new version, so old entries are not used
+        path = model_registry.get_model_path('logistic')
+        with open(path, 'rb') as model_file:
+            payload = pickle.load(model_file)
+        payload['version'] = 'retrained'
+        model_registry._write_atomic(path, pickle.dumps(payload))
+        model, probabilities, hit = prediction_cache.predict('logistic', [5.1, 3.5, 1.4, 0.2])
+        self.assertFalse(hit)
+        self.assertEqual(model.version, 'retrained')
+
+
+class MLWarmUpTests(TestCase):
+    """scikit-learn stays unimported until needed; warm_up() preloads published models"""
+
+    def test_startup_does_not_import_sklearn(self):
+        probe = (
+            'import sys, django; django.setup(); import iris_config.urls; '
+            'print(any(name.split(".")[0] in ("sklearn", "numpy") for name in sys.modules))'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'iris_config.settings', 'IRIS_ML_WARMUP': '0'}
+        output = subprocess.run(
+            [sys.executable, '-c', probe], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+
+    def test_warm_up_loads_published_models_only(self):
+        use_temporary_model_dir(self)
+        self.assertEqual(model_registry.warm_up(), [])
+        model_registry.train_model('knn', model_registry.load_bundled_data())
+        model_registry.clear_cache()
+        self.assertEqual(model_registry.warm_up(), ['knn'])
+        self.assertFalse(model_registry.get_model_path('logistic').exists())
+
+
+class CSVImportTests(TestCase):
+    """import_rows() inserts valid rows in bulk and reports the invalid ones"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='secret')
+        self.lab = Laboratory.objects.create(name='Lab A', city='Ankara')
+
+    def row(self, **values):
+        return {
+            'sepal_length': '5.1', 'sepal_width': '3.5', 'petal_length': '1.4', 'petal_width': '0.2',
+            'species': 'Setosa ', 'lab_id': '', **values,
+        }
+
+    def test_valid_and_invalid_rows(self):
+        rows = [
+            self.row(lab_id=str(self.lab.pk)),
+            self.row(species='rose'),
+            self.row(sepal_width=''),
+            self.row(petal_length='abc'),
+            self.row(petal_width='-1'),
+            self.row(lab_id='x'),
+            self.row(lab_id='999'),
+            self.row(sepal_length='nan'),
+            self.row(petal_width='inf'),
+            self.row(petal_length='-Infinity'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            result = importers.import_rows(rows, self.user)
+        self.assertEqual(result.imported_count, 2)
+        self.assertEqual([error['line'] for error in result.errors], [3, 4, 5, 6, 7, 9, 10, 11])
+        self.assertEqual(result.errors[0]['error'], "invalid species 'rose'")
+        self.assertEqual(result.errors[5]['error'], "sepal_length: 'nan' is not a finite number")
+        self.assertEqual(sum(query['sql'].startswith('INSERT INTO "iris_app_irisplant"') for query in queries.captured_queries), 1)
+        # Unknown laboratories are imported without a lab
+        self.assertEqual(
+            sorted(IrisPlant.objects.values_list('lab_id', flat=True), key=lambda lab_id: lab_id or 0),
+            [None, self.lab.pk]
+        )
+        self.assertEqual(set(IrisPlant.objects.values_list('species', flat=True)), {'setosa'})
+
+    def test_reported_errors_are_capped(self):
+        with override_settings(IRIS_IMPORT_MAX_REPORTED_ERRORS=2):
+            result = importers.import_rows([self.row(species='')] * 5, self.user)
+        self.assertEqual((result.error_count, len(result.errors)), (5, 2))
+        self.assertTrue(result.errors_truncated)
+
+    def test_failure_rolls_back_the_whole_file(self):
+        rows = [self.row()] * 3 + [self.row(lab_id=str(self.lab.pk))]
+        # The second chunk fails after the first one was written
+        with mock.patch.object(importers, 'apply_bulk_insert_summaries', side_effect=[None, RuntimeError('disk full')]):
+            with self.assertRaises(RuntimeError):
+                importers.import_rows(rows, self.user, batch_size=2)
+        self.assertFalse(IrisPlant.objects.exists())
+
+
+class StreamingUploadTests(TestCase):
+    """iter_lines() decodes byte chunks into lines, whatever the chunk boundaries"""
+
+    def lines(self, chunks):
+        return list(importers.iter_lines(chunks))
+
+    def test_line_endings_and_characters_split_across_chunks(self):
+        self.assertEqual(self.lines([b'a,b\r', b'\nc\r', b'\n']), ['a,b\r\n', 'c\r\n'])
+        self.assertEqual(self.lines([b'a\r', b'b']), ['a\r', 'b'])
+        self.assertEqual(self.lines([b'a\r']), ['a\r'])
+        self.assertEqual(self.lines([b'a\nb']), ['a\n', 'b'])
+        self.assertEqual(self.lines([b'x\xc3', b'\xa9y\n']), ['x\xe9y\n'])
+        # The byte order mark is dropped even when it is split
+        self.assertEqual(self.lines([b'\xef\xbb', b'\xbfa\n']), ['a\n'])
+
+    def test_every_chunk_size(self):
+        text = 'species,lab\r\nsétosa,1\rvirginica,2\n\nversicolor,3\r\n€'
+        data = text.encode('utf-8')
+        for size in range(1, len(data) + 1):
+            chunks = [data[start:start + size] for start in range(0, len(data), size)]
+            with self.subTest(size=size):
+                self.assertEqual(self.lines(chunks), text.splitlines(keepends=True))
+
+    def test_uploaded_file_is_imported_chunk_by_chunk(self):
+        user = User.objects.create_user('uploader', password='secret')
+        body = 'sepal_length,sepal_width,petal_length,petal_width,species\r\n' + '5.1,3.5,1.4,0.2,setosa\r\n' * 50
+        # Like a TemporaryUploadedFile, read in small chunks
+        upload = File(io.BytesIO(body.encode()), name='samples.csv')
+        upload.DEFAULT_CHUNK_SIZE = 7
+        self.assertGreater(len(list(upload.chunks())), 100)
+        result = importers.import_csv_file(upload, user)
+        self.assertEqual((result.imported_count, result.error_count), (50, 0))
+
+
+class ImportJobTests(TestCase):
+    """Background import jobs are claimed once and record their progress"""
+
+    header = 'sepal_length,sepal_width,petal_length,petal_width,species\n'
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, IRIS_IMPORT_BATCH_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('importer', password='secret')
+
+    def create_job(self, body, **kwargs):
+        return ImportJob.objects.create(
+            csv_file=ContentFile(body, name='samples.csv'), file_name='samples.csv',
+            total_bytes=len(body), created_by=self.user, **kwargs
+        )
+
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        first = self.create_job(b'')
+        second = self.create_job(b'')
+        self.create_job(b'', status=ImportJob.STATUS_COMPLETED)
+
+        claimed = importers.claim_import_job()
+        self.assertEqual((claimed.pk, claimed.status), (first.pk, ImportJob.STATUS_RUNNING))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(importers.claim_import_job().pk, second.pk)
+        self.assertIsNone(importers.claim_import_job())
+
+    def test_completed_job(self):
+        body = (self.header + '5.1,3.5,1.4,0.2,setosa\n' * 4 + '5.1,3.5,1.4,0.2,rose\n').encode()
+        job = self.create_job(body, status=ImportJob.STATUS_RUNNING)
+        with mock.patch.object(ImportJob.objects, 'filter', wraps=ImportJob.objects.filter) as job_filter:
+            job = importers.run_import_job(job)
+
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.rows_processed, job.rows_imported, job.rows_failed), (5, 4, 1))
+        self.assertEqual(job.errors, [{'line': 6, 'error': "invalid species 'rose'"}])
+        self.assertEqual((job.bytes_processed, job.progress), (len(body), 100))
+        self.assertFalse(job.csv_file)
+        self.assertEqual(IrisPlant.objects.count(), 4)
+        # Progress is written after every chunk of IRIS_IMPORT_BATCH_SIZE rows
+        self.assertEqual(job_filter.call_count, 3)
+
+    def test_retried_job_reports_updated_and_unchanged_rows(self):
+        header = 'sepal_length,sepal_width,petal_length,petal_width,species,external_id\n'
+        body = (header + ''.join(f'5.1,3.5,1.4,0.2,setosa,J-{index}\n' for index in range(3))).encode()
+        importers.run_import_job(self.create_job(body, status=ImportJob.STATUS_RUNNING))
+
+        retry = importers.run_import_job(self.create_job(body, status=ImportJob.STATUS_RUNNING))
+        self.assertEqual((retry.rows_imported, retry.rows_updated, retry.rows_unchanged), (0, 0, 3))
+
+        changed = body.replace(b'setosa,J-0', b'versicolor,J-0')
+        job = importers.run_import_job(self.create_job(changed, status=ImportJob.STATUS_RUNNING))
+        self.assertEqual((job.rows_imported, job.rows_updated, job.rows_unchanged), (1, 1, 2))
+        self.assertEqual(IrisPlant.objects.count(), 3)
+
+    def test_failed_job_keeps_the_committed_chunks(self):
+        body = (self.header + '5.1,3.5,1.4,0.2,setosa\n' * 5).encode() + b'\xff\xfe,broken\n'
+        # Small reads, so the first chunks are imported before the invalid bytes are decoded
+        with mock.patch.object(File, 'DEFAULT_CHUNK_SIZE', 16):
+            job = importers.run_import_job(self.create_job(body, status=ImportJob.STATUS_RUNNING))
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn('decode', job.error_message)
+        self.assertEqual(job.rows_imported, 4)
+        self.assertEqual(IrisPlant.objects.count(), 4)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job_keeps_the_row_errors(self):
+        body = (self.header + '5.1,3.5,1.4,0.2,rose\n' + '5.1,3.5,1.4,0.2,setosa\n' * 4).encode() + b'\xff\xfe,broken\n'
+        with mock.patch.object(File, 'DEFAULT_CHUNK_SIZE', 16):
+            job = importers.run_import_job(self.create_job(body, status=ImportJob.STATUS_RUNNING))
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertEqual((job.rows_imported, job.rows_failed), (3, 1))
+        self.assertEqual(job.errors, [{'line': 2, 'error': "invalid species 'rose'"}])
+
+    def test_stale_running_job_is_resumed(self):
+        body = (self.header + '5.1,3.5,1.4,0.2,setosa\n' * 2 + '5.1,3.5,1.4,0.2,rose\n' + '6.0,3.0,4.5,1.5,versicolor\n' * 3).encode()
+        # The worker died after committing the first two chunks (4 rows)
+        job = self.create_job(
+            body, status=ImportJob.STATUS_RUNNING, started_at=timezone.now(), rows_processed=4,
+            rows_imported=3, rows_failed=1, errors=[{'line': 4, 'error': "invalid species 'rose'"}]
+        )
+        self.assertIsNone(importers.claim_import_job())
+
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        claimed = importers.claim_import_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.started_at, job.started_at)
+
+        job = importers.run_import_job(claimed)
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.rows_processed, job.rows_imported, job.rows_failed), (6, 5, 1))
+        self.assertEqual(len(job.errors), 1)
+        # Only the rows after the processed ones are imported
+        self.assertEqual(IrisPlant.objects.count(), 2)
+
+    def test_api_lists_own_jobs_only(self):
+        own = self.create_job(b'')
+        other = User.objects.create_user('other', password='secret')
+        ImportJob.objects.create(csv_file=ContentFile(b'', name='x.csv'), file_name='x.csv', created_by=other)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/import-jobs/')
+        self.assertEqual([job['id'] for job in response.json()['results']], [own.pk])
+
+
+class CSVExportTests(TestCase):
+    """The CSV export is streamed in blocks of IRIS_EXPORT_CHUNK_SIZE rows"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', password='secret')
+        self.client.force_login(self.user)
+        self.lab = Laboratory.objects.create(name='Ankara Lab', city='Ankara')
+
+    @override_settings(IRIS_EXPORT_CHUNK_SIZE=2)
+    def test_export_is_streamed_in_chunks(self):
+        create_samples(self.user, [self.lab], 5)
+        IrisPlant.objects.create(
+            sepal_length=6.3, sepal_width=2.9, petal_length=5.6, petal_width=1.8,
+            species='virginica', created_by=self.user
+        )
+
+        response = self.client.get(reverse('export_csv'))
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="iris_export.csv"', response['Content-Disposition'])
+        chunks = [chunk.decode('utf-8') for chunk in response.streaming_content]
+        # header + 2 rows, 2 rows, 2 rows, then the (empty) remainder
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(chunks[0].startswith('﻿'))
+
+        rows = list(csv.reader(io.StringIO(''.join(chunks).lstrip('﻿'))))
+        self.assertEqual(rows[0], ['species', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'lab_id', 'date'])
+        self.assertEqual(len(rows), 7)
+        species = dict(IrisPlant.SPECIES_CHOICES)
+        values = sorted(row[:6] for row in rows[1:])
+        self.assertEqual(values[0], [species['setosa'], '5.1', '3.5', '1.4', '0.2', 'Ankara Lab'])
+        self.assertEqual(values[-1], [species['virginica'], '6.3', '2.9', '5.6', '1.8', 'N/A'])
+
+    def test_empty_export_has_header_only(self):
+        response = self.client.get(reverse('export_csv'))
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(len(list(csv.reader(io.StringIO(content)))), 1)
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse('export_csv'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ColumnarExportTests(TestCase):
+    """The npz export holds the whole dataset as typed NumPy columns"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.lab = Laboratory.objects.create(name='Ankara Lab', city='Ankara')
+
+    def load_npz(self):
+        import numpy as np
+
+        response = self.client.get('/api/iris/export/npz/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('iris_export.npz', response['Content-Disposition'])
+        return np.load(io.BytesIO(b''.join(response.streaming_content)))
+
+    @override_settings(IRIS_EXPORT_CHUNK_SIZE=2)
+    def test_npz_export(self):
+        plants = create_samples(self.user, [self.lab], 3)
+        plants.append(IrisPlant.objects.create(
+            sepal_length=6.3, sepal_width=2.9, petal_length=5.6, petal_width=1.8,
+            species='virginica', created_by=self.user
+        ))
+
+        data = self.load_npz()
+
+        self.assertEqual(list(data['feature_names']), list(exporters.FEATURE_FIELDS))
+        self.assertEqual(list(data['species_names']), exporters.SPECIES_CODES)
+        self.assertEqual(data['id'].tolist(), sorted(plant.pk for plant in plants))
+        self.assertEqual(data['features'].dtype.name, 'float32')
+        self.assertEqual(data['features'].shape, (4, 4))
+        self.assertEqual(data['features'][-1].tolist(), [
+            float(data['features'].dtype.type(value)) for value in (6.3, 2.9, 5.6, 1.8)
+        ])
+        species = [exporters.SPECIES_CODES[code] for code in data['species']]
+        self.assertEqual(species, ['setosa'] * 3 + ['virginica'])
+        self.assertEqual(data['lab_id'].tolist(), [self.lab.pk] * 3 + [-1])
+        self.assertEqual(data['created_at'].dtype.name, 'datetime64[us]')
+
+    def test_empty_npz_export(self):
+        data = self.load_npz()
+        self.assertEqual(data['features'].shape, (0, 4))
+        self.assertEqual(len(data['id']), 0)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/iris/export/xlsx/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    @skipUnless(not exporters.pyarrow_available(), 'pyarrow is installed')
+    def test_arrow_formats_require_pyarrow(self):
+        response = self.client.get('/api/iris/export/parquet/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pyarrow', response.json()['error'])
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset pages follow (-created_at, -id) in both directions"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('pager', password='secret')
+        lab = Laboratory.objects.create(name='Lab', city='Istanbul')
+        plants = create_samples(self.user, [lab], 7)
+        # rows sharing a timestamp must still be ordered by id
+        stamp = plants[0].created_at
+        IrisPlant.objects.filter(pk__in=[plant.pk for plant in plants[2:5]]).update(created_at=stamp)
+        self.expected = list(
+            IrisPlant.objects.order_by('-created_at', '-id').values_list('pk', flat=True)
+        )
+        self.paginator = KeysetPaginator(IrisPlant.objects.all(), 3)
+
+    def ids(self, page):
+        return [plant.pk for plant in page]
+
+    def test_forward_and_backward(self):
+        first = self.paginator.page()
+        self.assertEqual(self.ids(first), self.expected[:3])
+        self.assertFalse(first.has_previous())
+
+        second = self.paginator.page(after=first.next_cursor)
+        self.assertEqual(self.ids(second), self.expected[3:6])
+        third = self.paginator.page(after=second.next_cursor)
+        self.assertEqual(self.ids(third), self.expected[6:])
+        self.assertFalse(third.has_next())
+
+        back = self.paginator.page(before=third.previous_cursor)
+        self.assertEqual(self.ids(back), self.expected[3:6])
+        self.assertTrue(back.has_next())
+        start = self.paginator.page(before=back.previous_cursor)
+        self.assertEqual(self.ids(start), self.expected[:3])
+        self.assertFalse(start.has_previous())
+
+    def test_invalid_cursors(self):
+        for cursor in ('not-a-cursor', encode_text('2024-01-01|x'), encode_text('yesterday|1'), '%%%'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidPage):
+                self.paginator.page(after=cursor)
+        with self.assertRaises(InvalidPage):
+            self.paginator.page(before='not-a-cursor')
+
+    def test_list_view_redirects_on_invalid_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('iris_list'), {'after': 'garbage'})
+        self.assertRedirects(response, reverse('iris_list'), fetch_redirect_response=False)
+
+    def test_api_cursor_pagination(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        seen = []
+        url = '/api/iris/?page_size=3'
+        while url:
+            data = client.get(url).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, self.expected)
+
+
+class APIQueryCountTests(TestCase):
+    """The number of queries per API page must not grow with the page size"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.labs = [
+            Laboratory.objects.create(name=f'Lab {index}', city='Istanbul')
+            for index in range(5)
+        ]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_iris_list_queries_are_constant(self):
+        create_samples(self.user, self.labs, 2)
+        small, _ = self.count_queries('/api/iris/?expand=lab_detail')
+
+        create_samples(self.user, self.labs, 40)
+        large, data = self.count_queries('/api/iris/?expand=lab_detail')
+
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(small, large)
+
+    def test_iris_list_lab_detail_has_count(self):
+        create_samples(self.user, self.labs, 10)
+        _, data = self.count_queries('/api/iris/?expand=lab_detail')
+
+        for sample in data['results']:
+            lab = Laboratory.objects.get(pk=sample['lab'])
+            self.assertEqual(sample['lab_detail']['iris_count'], lab.iris_plants.count())
+
+    def test_laboratory_list_queries_are_constant(self):
+        small, _ = self.count_queries('/api/laboratories/')
+
+        for index in range(5, 25):
+            Laboratory.objects.create(name=f'Lab {index}', city='Ankara')
+        create_samples(self.user, Laboratory.objects.all(), 50)
+        large, data = self.count_queries('/api/laboratories/')
+
+        self.assertEqual(small, large)
+        self.assertEqual(
+            sum(lab['iris_count'] for lab in data['results']),
+            IrisPlant.objects.filter(lab__in=[lab['id'] for lab in data['results']]).count()
+        )
+
+
+class SampleCountTests(TestCase):
+    """Laboratory.sample_count must follow every way samples are written"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('editor', password='secret')
+        self.lab_a = Laboratory.objects.create(name='Lab A', city='Istanbul')
+        self.lab_b = Laboratory.objects.create(name='Lab B', city='Ankara')
+
+    def assertCounts(self, count_a, count_b):
+        self.lab_a.refresh_from_db()
+        self.lab_b.refresh_from_db()
+        self.assertEqual((self.lab_a.sample_count, self.lab_b.sample_count), (count_a, count_b))
+        self.assertEqual(self.lab_a.sample_count, self.lab_a.iris_plants.count())
+        self.assertEqual(self.lab_b.sample_count, self.lab_b.iris_plants.count())
+
+    def test_create_change_lab_and_delete(self):
+        plant = IrisPlant.objects.create(
+            sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2,
+            species='setosa', lab=self.lab_a, created_by=self.user
+        )
+        self.assertCounts(1, 0)
+
+        plant.lab = self.lab_b
+        plant.save()
+        self.assertCounts(0, 1)
+
+        plant.lab = None
+        plant.save()
+        self.assertCounts(0, 0)
+
+        plant.lab = self.lab_a
+        plant.save()
+        plant.delete()
+        self.assertCounts(0, 0)
+
+    def test_batched_bulk_delete(self):
+        create_samples(self.user, [self.lab_a, self.lab_b], 10)
+        self.assertCounts(5, 5)
+
+        with batched_summary_updates():
+            IrisPlant.objects.filter(lab=self.lab_a).delete()
+        self.assertCounts(0, 5)
+
+    def test_deleting_user_cascades_to_counts(self):
+        create_samples(self.user, [self.lab_a, self.lab_b], 4)
+        self.user.delete()
+        self.assertCounts(0, 0)
+
+    def test_csv_import_updates_counts(self):
+        rows = [
+            {'sepal_length': '5.1', 'sepal_width': '3.5', 'petal_length': '1.4',
+             'petal_width': '0.2', 'species': 'setosa', 'lab_id': str(lab.pk)}
+            for lab in [self.lab_a, self.lab_a, self.lab_b]
+        ]
+        result = importers.import_rows(rows, self.user)
+        self.assertEqual(result.imported_count, 3)
+        self.assertCounts(2, 1)
+
+
+class StatisticsTests(TestCase):
+    """The statistics endpoint reads the summary table and matches the raw data"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user('editor', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.labs = [
+            Laboratory.objects.create(name=f'Lab {index}', city='Izmir')
+            for index in range(3)
+        ]
+
+    def create_plant(self, values, species='setosa', lab=None):
+        return IrisPlant.objects.create(
+            sepal_length=values[0], sepal_width=values[1], petal_length=values[2], petal_width=values[3],
+            species=species, lab=lab, created_by=self.user
+        )
+
+    def assertMatchesTable(self):
+        data = self.client.get('/api/iris/statistics/').json()
+        total = data['total_statistics']
+        expected = IrisPlant.objects.aggregate(
+            total_samples=Count('id'),
+            avg_sepal_length=Avg('sepal_length'),
+            min_petal_width=Min('petal_width'),
+            max_petal_width=Max('petal_width'),
+            max_sepal_length=Max('sepal_length'),
+        )
+        self.assertEqual(total['total_samples'], expected['total_samples'])
+        for key in ('avg_sepal_length', 'min_petal_width', 'max_petal_width', 'max_sepal_length'):
+            if expected[key] is None:
+                self.assertIsNone(total[key])
+            else:
+                self.assertAlmostEqual(total[key], expected[key])
+
+        values = list(IrisPlant.objects.values_list('petal_length', flat=True))
+        if len(values) > 1:
+            self.assertAlmostEqual(total['variance_petal_length'], statistics.variance(values))
+            self.assertAlmostEqual(total['std_petal_length'], statistics.stdev(values))
+
+        species_counts = dict(IrisPlant.objects.values_list('species').annotate(Count('id')))
+        self.assertEqual(
+            {entry['species']: entry['count'] for entry in data['species_distribution']},
+            species_counts
+        )
+        lab_counts = dict(IrisPlant.objects.values_list('lab__name').annotate(Count('id')))
+        self.assertEqual(
+            {entry['lab__name']: entry['count'] for entry in data['laboratory_distribution']},
+            lab_counts
+        )
+
+    def test_statistics_follow_writes(self):
+        self.assertMatchesTable()
+
+        # Cached statistics are invalidated when the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_plant((5.1, 3.5, 1.4, 0.2), lab=self.labs[0])
+            second = self.create_plant((7.9, 3.8, 6.4, 2.0), species='virginica', lab=self.labs[0])
+            self.create_plant((4.3, 2.0, 1.0, 0.1), lab=self.labs[1])
+            self.create_plant((6.0, 2.2, 4.0, 1.0), species='versicolor')
+        self.assertMatchesTable()
+
+        # Changing the maximum row and moving it to another lab
+        with self.captureOnCommitCallbacks(execute=True):
+            second.sepal_length = 6.3
+            second.lab = self.labs[2]
+            second.save()
+        self.assertMatchesTable()
+
+        # Deleting the group minimum forces a re-aggregation of that group
+        with self.captureOnCommitCallbacks(execute=True):
+            IrisPlant.objects.filter(sepal_length=4.3).delete()
+            first.delete()
+        self.assertMatchesTable()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_samples(self.user, self.labs, 9)
+            with batched_summary_updates():
+                IrisPlant.objects.filter(lab=self.labs[1]).delete()
+        self.assertMatchesTable()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.labs[2].delete()
+        self.assertMatchesTable()
+
+    def test_rebuild_statistics_check_is_read_only(self):
+        self.create_plant((5.1, 3.5, 1.4, 0.2), lab=self.labs[0])
+        IrisStatistics.objects.update(count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_statistics', '--check', stdout=io.StringIO())
+        self.assertEqual(IrisStatistics.objects.get().count, 5)
+
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        self.assertEqual(IrisStatistics.objects.get().count, 1)
+        call_command('rebuild_statistics', '--check', stdout=io.StringIO())
+
+    def test_repairs_invalidate_the_cached_statistics(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_plant((5.1, 3.5, 1.4, 0.2), lab=self.labs[0])
+        IrisStatistics.objects.update(count=5)
+        Laboratory.objects.filter(pk=self.labs[0].pk).update(sample_count=5)
+        self.assertEqual(self.client.get('/api/iris/statistics/').json()['total_statistics']['total_samples'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_statistics', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/iris/statistics/').json()['total_statistics']['total_samples'], 1)
+
+        generation = dataset_cache.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recount_lab_samples', stdout=io.StringIO())
+        self.assertNotEqual(dataset_cache.get_generation(), generation)
+
+        # Nothing to repair, nothing to invalidate
+        generation = dataset_cache.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_statistics', stdout=io.StringIO())
+            call_command('recount_lab_samples', stdout=io.StringIO())
+        self.assertEqual(dataset_cache.get_generation(), generation)
+
+    def test_statistics_queries_are_constant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_samples(self.user, self.labs, 3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/iris/statistics/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_samples(self.user, self.labs, 300)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/iris/statistics/')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_statistics_are_cached_until_a_write(self):
+        self.create_plant((5.1, 3.5, 1.4, 0.2), lab=self.labs[0])
+        response = self.client.get('/api/iris/statistics/')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/iris/statistics/')
+            not_modified = self.client.get('/api/iris/statistics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(not_modified.status_code, 304)
+
+        # Renaming a laboratory changes the payload, so the ETag changes too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.labs[0].name = 'Renamed'
+            self.labs[0].save()
+        changed = self.client.get('/api/iris/statistics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['laboratory_distribution'][0]['lab__name'], 'Renamed')
+
+
+class SimilarityTests(TestCase):
+    """/api/iris/{id}/similar/ returns the true nearest neighbours"""
+
+    def setUp(self):
+        caches['default'].clear()
+        similarity.clear_index()
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.lab = Laboratory.objects.create(name='Lab', city='Ankara')
+        self.reference = self.create_plant((5.0, 3.0, 1.5, 0.2), 'setosa')
+        self.near = self.create_plant((5.1, 3.0, 1.5, 0.2), 'versicolor', self.lab)
+        self.middle = self.create_plant((5.5, 3.0, 1.5, 0.2), 'setosa', self.lab)
+        self.far = self.create_plant((7.0, 3.0, 6.0, 2.0), 'virginica')
+
+    def create_plant(self, values, species, lab=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return IrisPlant.objects.create(
+                sepal_length=values[0], sepal_width=values[1], petal_length=values[2], petal_width=values[3],
+                species=species, lab=lab, created_by=self.user
+            )
+
+    def similar(self, query=''):
+        response = self.client.get(f'/api/iris/{self.reference.pk}/similar/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(sample['id'], round(sample['distance'], 6)) for sample in response.json()['similar_samples']]
+
+    def test_nearest_neighbours_and_filters(self):
+        self.assertEqual(self.similar('?k=2'), [(self.near.pk, 0.1), (self.middle.pk, 0.5)])
+        self.assertEqual(self.similar('?k=2&metric=manhattan&species=setosa'), [(self.middle.pk, 0.5)])
+        self.assertEqual([pk for pk, distance in self.similar('?lab=none')], [self.far.pk])
+        self.assertEqual([pk for pk, distance in self.similar(f'?lab={self.lab.pk}&k=1')], [self.near.pk])
+        self.assertEqual(self.client.get(f'/api/iris/{self.reference.pk}/similar/?k=0').status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.similar()
+        closest = self.create_plant((5.0, 3.0, 1.5, 0.25), 'setosa')
+        self.assertEqual(self.similar('?k=1'), [(closest.pk, 0.05)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            closest.delete()
+            self.near.sepal_length = 6.5
+            self.near.save()
+        self.assertEqual(self.similar('?k=1'), [(self.middle.pk, 0.5)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lab.delete()
+        self.assertEqual({pk for pk, distance in self.similar('?lab=none')}, {self.near.pk, self.middle.pk, self.far.pk})
+
+    def test_sync_builds_a_new_index(self):
+        before = similarity.get_index()
+        self.create_plant((5.0, 3.0, 1.5, 0.25), 'setosa')
+        after = similarity.get_index()
+
+        self.assertIsNot(before, after)
+        self.assertEqual(len(before), 4)
+        self.assertEqual(len(after), 5)
+        self.assertFalse(after.features.flags.writeable)
+
+    def test_queries_use_a_consistent_snapshot(self):
+        import numpy as np
+
+        shared = {'index': similarity.SimilarityIndex(np)}
+        errors = []
+        queries = []
+        done = threading.Event()
+
+        def write():
+            for step in range(300):
+                rows = [(pk, step, step, step, step, 'setosa', None) for pk in range(step % 7, 300, 7)]
+                shared['index'] = shared['index'].upsert(rows)
+            done.set()
+
+        def read():
+            while not done.is_set():
+                index = shared['index']
+                try:
+                    positions, distances = index.query([[0.0, 0.0, 0.0, 0.0]], k=3)
+                    queries.append(len(positions[0]))
+                    for neighbour in index.describe(positions[0], distances[0]):
+                        expected = np.linalg.norm([neighbour[field] for field in similarity.FEATURE_FIELDS])
+                        if abs(neighbour['distance'] - expected) > 1e-9:
+                            errors.append(neighbour)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=read) for _ in range(3)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(queries)
+
+    def test_resync_without_generation_change(self):
+        self.similar()
+        # Simulates a write by another worker: the local generation is not bumped
+        closest = IrisPlant.objects.create(
+            sepal_length=5.0, sepal_width=3.0, petal_length=1.5, petal_width=0.25,
+            species='setosa', created_by=self.user
+        )
+        with override_settings(IRIS_SIMILARITY_RESYNC_INTERVAL=3600):
+            self.assertNotEqual(self.similar('?k=1')[0][0], closest.pk)
+        with override_settings(IRIS_SIMILARITY_RESYNC_INTERVAL=0):
+            self.assertEqual(self.similar('?k=1'), [(closest.pk, 0.05)])
+
+    def test_nearest_by_measurements(self):
+        response = self.client.get(
+            '/api/iris/nearest/?sepal_length=5.4&sepal_width=3&petal_length=1.5&petal_width=0.2&k=2'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([sample['id'] for sample in response.json()['neighbours']], [self.middle.pk, self.near.pk])
+        self.assertEqual(self.client.get('/api/iris/nearest/?sepal_length=5.4').status_code, 400)
+
+        response = self.client.post('/api/iris/nearest/batch/', {
+            'samples': [[5.0, 3.0, 1.5, 0.2], [7.1, 3.0, 6.0, 2.0]],
+            'k': 1,
+            'metric': 'manhattan',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['neighbours'][0]['id'] for result in response.json()['results']],
+            [self.reference.pk, self.far.pk]
+        )
+
+    def test_nearest_endpoints_during_index_swaps(self):
+        import numpy as np
+
+        shared = {'index': similarity.SimilarityIndex(np).upsert([(1, 1.0, 1.0, 1.0, 1.0, 'setosa', None)])}
+        factory = APIRequestFactory()
+        nearest = IrisViewSet.as_view({'get': 'nearest'})
+        nearest_batch = IrisViewSet.as_view({'post': 'nearest_batch'})
+        errors = []
+        done = threading.Event()
+
+        def write():
+            for step in range(200):
+                rows = [(pk, step, step, step, step, 'setosa', None) for pk in range(step % 5, 200, 5)]
+                shared['index'] = shared['index'].upsert(rows)
+            done.set()
+
+        def check(neighbours):
+            for neighbour in neighbours:
+                expected = np.linalg.norm([neighbour[field] for field in similarity.FEATURE_FIELDS])
+                if abs(neighbour['distance'] - expected) > 1e-9:
+                    errors.append(neighbour)
+
+        def read():
+            while not done.is_set():
+                request = factory.get('/api/iris/nearest/', dict.fromkeys(similarity.FEATURE_FIELDS, 0))
+                force_authenticate(request, self.user)
+                response = nearest(request)
+                if response.status_code != 200:
+                    errors.append(response.data)
+                    continue
+                check(response.data['neighbours'])
+
+                request = factory.post('/api/iris/nearest/batch/', {'samples': [[0, 0, 0, 0]] * 3}, format='json')
+                force_authenticate(request, self.user)
+                response = nearest_batch(request)
+                if response.status_code != 200:
+                    errors.append(response.data)
+                    continue
+                for result in response.data['results']:
+                    check(result['neighbours'])
+
+        threads = [threading.Thread(target=read) for _ in range(3)] + [threading.Thread(target=write)]
+        with mock.patch.object(similarity, 'get_index', lambda: shared['index']):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """The common search filter combinations must use an index, never a full table scan"""
+
+    SEARCHES = [
+        'species=setosa',
+        'species=virginica&min_petal_length=4.5',
+        'species=versicolor&min_sepal_length=5&max_sepal_length=6.5',
+        'species=setosa&min_sepal_length=4&min_petal_length=1&max_petal_length=2',
+        'min_sepal_length=5&max_sepal_length=6',
+        'min_petal_length=3',
+        'max_petal_length=1.5&min_sepal_length=4',
+    ]
+    API_ONLY_SEARCHES = [
+        'min_sepal_width=3&max_sepal_width=3.5',
+        'max_petal_width=0.4',
+        'species=virginica&min_petal_width=2',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.lab = Laboratory.objects.create(name='Lab', city='Bursa')
+        create_samples(self.user, [self.lab], 5)
+
+    def assertNoTableScan(self, queries):
+        """
+        Filtered IrisPlant queries must SEARCH an index. The only scan
+        allowed is walking an index in ORDER BY order (SQLite prefers it to
+        sorting for unselective one-sided ranges); the COUNT of the same
+        filters has no ORDER BY, so it proves the filters are index-backed.
+        """
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if 'FROM "iris_app_irisplant"' not in query['sql']:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append((' ORDER BY ' in query['sql'], [row[-1] for row in cursor.fetchall()]))
+        self.assertTrue(any(not ordered for ordered, plan in plans), 'no unordered IrisPlant query was captured')
+        for ordered, plan in plans:
+            for step in plan:
+                if step.startswith('SCAN iris_app_irisplant'):
+                    self.assertTrue(ordered and ' USING ' in step, f'full scan in query plan: {plan}')
+
+    def capture(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries.captured_queries
+
+    def test_search_page(self):
+        self.client.force_login(self.user)
+        for search in self.SEARCHES + [f'lab={self.lab.pk}', f'species=setosa&lab={self.lab.pk}']:
+            with self.subTest(search=search):
+                self.assertNoTableScan(self.capture(self.client, f'/search/?{search}'))
+
+    def test_advanced_search_api(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        searches = self.SEARCHES + self.API_ONLY_SEARCHES + [
+            f'lab_id={self.lab.pk}', f'created_by_id={self.user.pk}',
+        ]
+        for search in searches:
+            with self.subTest(search=search):
+                self.assertNoTableScan(self.capture(client, f'/api/iris/search/advanced/?{search}&count=true'))
+
+
+class SearchFilterTests(TestCase):
+    """search/advanced and the list endpoint share the IrisSearchForm filters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.labs = [Laboratory.objects.create(name=f'Lab {index}', city='Konya') for index in range(2)]
+        create_samples(self.user, self.labs, 6)
+        self.large = IrisPlant.objects.create(
+            sepal_length=7.7, sepal_width=2.6, petal_length=6.9, petal_width=2.3,
+            species='virginica', lab=self.labs[1], created_by=self.user
+        )
+
+    def test_filters_pagination_and_projection(self):
+        response = self.client.get('/api/iris/search/advanced/?species=virginica&min_petal_length=6&fields=id,species')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'], [{'id': self.large.pk, 'species': 'virginica'}])
+
+        response = self.client.get(f'/api/iris/search/advanced/?lab_id={self.labs[0].pk}&count=true&page_size=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get('/api/iris/?max_petal_width=1&species=setosa')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_invalid_values_are_rejected(self):
+        for query in ('min_sepal_length=abc', 'species=rose', 'min_petal_length=5&max_petal_length=2', 'fields=nope'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/iris/search/advanced/?{query}').status_code, 400)
+
+    def test_search_page_uses_the_same_filters(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/search/?min_petal_width=2&max_petal_width=2.5')
+        self.assertEqual(response.context['result_count'], 1)
+        self.assertEqual(list(response.context['results']), [self.large])
+
+
+class ListSerializerTests(TestCase):
+    """The .values() list serializer matches IrisPlantSerializer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret', first_name='Ada', last_name='Lovelace')
+        self.other = User.objects.create_user('other', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        lab = Laboratory.objects.create(name='Lab', city='Adana', country='Turkey', established_year=1990)
+        create_samples(self.user, [lab], 3)
+        IrisPlant.objects.create(
+            sepal_length=6.3, sepal_width=2.9, petal_length=5.6, petal_width=1.8,
+            species='virginica', lab=None, created_by=self.other
+        )
+
+    def test_same_output_as_model_serializer(self):
+        response = self.client.get('/api/iris/?expand=lab_detail')
+        self.assertEqual(response.status_code, 200)
+        request = Request(response.wsgi_request)
+        expected = IrisPlantSerializer(
+            IrisPlant.objects.order_by('-created_at', '-id'), many=True, context={'request': request}
+        ).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+    def test_sparse_fieldsets(self):
+        results = self.client.get('/api/iris/').json()['results']
+        self.assertNotIn('lab_detail', results[0])
+
+        results = self.client.get('/api/iris/?fields=id,lab_detail&expand=lab_detail').json()['results']
+        self.assertEqual(set(results[0]), {'id', 'lab_detail'})
+        self.assertEqual(self.client.get('/api/iris/?expand=owner').status_code, 400)
+
+
+class RoleCacheTests(TestCase):
+    """Editor roles are read once per login and refreshed when groups change"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.editors = Group.objects.create(name='Editor')
+        self.user = User.objects.create_user('editor', password='secret')
+        self.user.groups.add(self.editors)
+        self.plant = IrisPlant.objects.create(
+            sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2,
+            species='setosa', created_by=self.user
+        )
+        self.urls = [
+            reverse('iris_list'),
+            reverse('iris_detail', args=[self.plant.pk]),
+            reverse('iris_create'),
+            reverse('iris_update', args=[self.plant.pk]),
+            reverse('iris_delete', args=[self.plant.pk]),
+            reverse('iris_search'),
+            reverse('import_csv'),
+            reverse('iris_predict'),
+        ]
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return [query['sql'] for query in queries.captured_queries if 'auth_group' in query['sql']]
+
+    def test_views_do_not_query_groups_after_login(self):
+        with CaptureQueriesContext(connection) as login_queries:
+            self.client.login(username='editor', password='secret')
+        self.assertEqual(sum('auth_group' in query['sql'] for query in login_queries.captured_queries), 1)
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.group_queries(url), [])
+        self.assertContains(self.client.get(reverse('iris_list')), reverse('iris_create'))
+
+    def test_roles_are_reloaded_when_membership_changes(self):
+        self.client.login(username='editor', password='secret')
+        self.group_queries(reverse('iris_list'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.editors)
+        response = self.client.get(reverse('iris_create'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('iris_create')}", fetch_redirect_response=False)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.editors.user_set.add(self.user)
+        self.assertEqual(len(self.group_queries(reverse('iris_create'))), 1)
+        self.assertEqual(self.group_queries(reverse('iris_create')), [])
+
+    def test_session_roles_expire(self):
+        self.client.login(username='editor', password='secret')
+
+        # The version is not bumped, as when the default cache is not shared
+        # with the worker that revoked the membership
+        self.user.groups.remove(self.editors)
+        self.assertEqual(self.client.get(reverse('iris_create')).status_code, 200)
+
+        with override_settings(IRIS_ROLES_SESSION_TTL=0):
+            response = self.client.get(reverse('iris_create'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('iris_create')}", fetch_redirect_response=False)
+
+
+class RowPermissionTests(TestCase):
+    """List pages compute can_edit in SQL and only select the shown columns"""
+
+    def setUp(self):
+        caches['default'].clear()
+        editors = Group.objects.create(name='Editor')
+        self.user = User.objects.create_user('editor', password='secret')
+        self.user.groups.add(editors)
+        self.other = User.objects.create_user('other', password='secret')
+        lab = Laboratory.objects.create(name='Lab A')
+        self.own = IrisPlant.objects.create(
+            sepal_length=5.1, sepal_width=3.5, petal_length=1.4, petal_width=0.2,
+            species='setosa', lab=lab, created_by=self.user
+        )
+        self.foreign = IrisPlant.objects.create(
+            sepal_length=6.3, sepal_width=3.3, petal_length=6.0, petal_width=2.5,
+            species='virginica', lab=lab, created_by=self.other
+        )
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        plant_queries = [query['sql'] for query in queries.captured_queries if 'iris_app_irisplant' in query['sql']]
+        return response, plant_queries
+
+    def test_dashboard(self):
+        self.client.login(username='editor', password='secret')
+        response, queries = self.list_queries(reverse('iris_list'))
+        page = response.context['samples']
+        self.assertEqual({sample.pk: sample.can_edit for sample in page}, {self.own.pk: True, self.foreign.pk: False})
+        self.assertContains(response, reverse('iris_update', args=[self.own.pk]))
+        self.assertNotContains(response, reverse('iris_update', args=[self.foreign.pk]))
+        self.assertEqual(response.context['own_count'], 1)
+        for sql in queries:
+            self.assertNotIn('auth_user', sql)
+            self.assertNotIn('"city"', sql)
+            self.assertNotIn('"updated_at"', sql)
+
+    def test_search_page(self):
+        self.client.login(username='other', password='secret')
+        response, queries = self.list_queries(reverse('iris_search') + '?species=virginica')
+        self.assertEqual([sample.can_edit for sample in response.context['results']], [False])
+        self.assertNotContains(response, reverse('iris_update', args=[self.foreign.pk]))
+        self.assertContains(response, 'other')
+        for sql in queries:
+            self.assertNotIn('"email"', sql)
+            self.assertNotIn('"password"', sql)
+
+
+class BulkAPITests(TestCase):
+    """bulk/ writes many samples per request and keeps the summaries in sync"""
+
+    def setUp(self):
+        caches['default'].clear()
+        similarity.clear_index()
+        self.user = User.objects.create_user('editor', password='secret')
+        self.other = User.objects.create_user('other', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.labs = [Laboratory.objects.create(name=f'Lab {index}', city='Izmir') for index in range(2)]
+        self.url = '/api/iris/bulk/'
+
+    def sample(self, petal_length=1.4, species='setosa', lab=None):
+        return {
+            'sepal_length': 5.1, 'sepal_width': 3.5, 'petal_length': petal_length, 'petal_width': 0.2,
+            'species': species, 'lab': lab.pk if lab else None,
+        }
+
+    def assertSummariesMatch(self):
+        for lab in Laboratory.objects.annotate(actual=Count('iris_plants')):
+            self.assertEqual(lab.sample_count, lab.actual, lab.name)
+        total = self.client.get('/api/iris/statistics/').json()['total_statistics']
+        expected = IrisPlant.objects.aggregate(count=Count('id'), avg=Avg('petal_length'))
+        self.assertEqual(total['total_samples'], expected['count'])
+        if expected['avg'] is not None:
+            self.assertAlmostEqual(total['avg_petal_length'], expected['avg'])
+
+    def test_create_update_delete(self):
+        samples = [self.sample(1.0 + index / 10, lab=self.labs[index % 2]) for index in range(20)]
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, samples, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['count'], 20)
+        ids = [result['id'] for result in response.json()['results']]
+        self.assertEqual(sorted(ids), sorted(IrisPlant.objects.values_list('id', flat=True)))
+        self.assertEqual(sum('INSERT INTO "iris_app_irisplant"' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(IrisPlant.objects.filter(created_by=self.user).count(), 20)
+        self.assertSummariesMatch()
+        self.assertEqual(len(similarity.get_index()), 20)
+
+        changes = [
+            {'id': ids[0], 'petal_length': 6.0, 'species': 'virginica', 'lab': None},
+            {'id': ids[1], 'petal_width': 0.2},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, {'samples': changes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['updated', 'unchanged'])
+        plant = IrisPlant.objects.get(pk=ids[0])
+        self.assertEqual((plant.species, plant.petal_length, plant.lab_id), ('virginica', 6.0, None))
+        self.assertGreater(plant.updated_at, plant.created_at)
+        self.assertSummariesMatch()
+        # The similarity index picks up the change on its next sync
+        index = similarity.get_index()
+        self.assertEqual(index.features[index.position(ids[0])][2], 6.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url, {'ids': ids[:5] + [0]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 5)
+        self.assertEqual(response.json()['results'][-1], {'id': 0, 'status': 'not_found'})
+        self.assertEqual(IrisPlant.objects.count(), 15)
+        self.assertSummariesMatch()
+
+    def test_invalid_items_reject_the_request(self):
+        samples = [self.sample(), self.sample(-1.0), self.sample(lab=self.labs[0]) | {'lab': 999}]
+        response = self.client.post(self.url, samples, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'1', '2'})
+        self.assertIn('lab', response.json()['errors']['2'])
+        self.assertFalse(IrisPlant.objects.exists())
+
+        response = self.client.patch(self.url, [{'petal_length': 1.0}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.json()['errors']['0'])
+
+    def test_ownership(self):
+        own = IrisPlant.objects.create(created_by=self.user, **self.sample())
+        foreign = IrisPlant.objects.create(created_by=self.other, **self.sample())
+
+        response = self.client.patch(
+            self.url, [{'id': own.pk, 'petal_length': 2.0}, {'id': foreign.pk, 'petal_length': 2.0}], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['1'])
+        self.assertEqual(IrisPlant.objects.get(pk=own.pk).petal_length, 1.4)
+
+        response = self.client.delete(self.url, {'ids': [own.pk, foreign.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IrisPlant.objects.count(), 2)
+
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+        response = self.client.delete(self.url, {'ids': [own.pk, foreign.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(IrisPlant.objects.exists())
+
+    def test_upsert_by_external_id(self):
+        samples = [
+            self.sample(1.0, lab=self.labs[0]) | {'external_id': 'A-1'},
+            self.sample(1.1, lab=self.labs[1]) | {'external_id': 'A-1'},
+            self.sample(1.2) | {'external_id': 'A-1'},
+            self.sample(1.3),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, samples, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [result['id'] for result in response.json()['results']]
+
+        # A retried request writes nothing, apart from the sample without an external_id
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, samples[:3], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'id': pk, 'status': 'unchanged'} for pk in ids[:3]])
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE'))])
+
+        changed = [samples[0] | {'species': 'virginica', 'petal_length': 6.0}, samples[2] | {'petal_length': 1.5}]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, changed, format='json')
+        self.assertEqual(response.json()['results'], [{'id': pk, 'status': 'updated'} for pk in (ids[0], ids[2])])
+        self.assertEqual(IrisPlant.objects.count(), 4)
+        self.assertEqual(IrisPlant.objects.get(pk=ids[0]).species, 'virginica')
+        self.assertEqual(IrisPlant.objects.get(pk=ids[2]).petal_length, 1.5)
+        self.assertSummariesMatch()
+
+        response = self.client.post(self.url, [samples[0], samples[0]], format='json')
+        self.assertEqual(list(response.json()['errors']), ['1'])
+
+        self.client.force_authenticate(self.other)
+        response = self.client.post(self.url, [samples[0]], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('external_id', response.json()['errors']['0'])
+
+    def test_csv_import_upserts(self):
+        rows = [
+            {'sepal_length': '5.1', 'sepal_width': '3.5', 'petal_length': str(1.0 + index / 10),
+             'petal_width': '0.2', 'species': 'setosa', 'lab_id': str(self.labs[0].pk) if index % 2 else '',
+             'external_id': f'S-{index}'}
+            for index in range(6)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = importers.import_rows(rows, self.user, batch_size=4)
+        self.assertEqual((result.imported_count, result.updated_count, result.unchanged_count), (6, 0, 0))
+
+        rows[0]['petal_length'] = rows[1]['petal_length'] = '4.0'
+        with self.captureOnCommitCallbacks(execute=True):
+            result = importers.import_rows(rows + [rows[5]], self.user, batch_size=10)
+        self.assertEqual((result.imported_count, result.updated_count, result.unchanged_count), (2, 2, 4))
+        self.assertEqual(result.errors, [{'line': 8, 'error': "external_id: 'S-5' repeats line 7"}])
+        self.assertEqual(IrisPlant.objects.count(), 6)
+        self.assertEqual(IrisPlant.objects.filter(petal_length=4.0).count(), 2)
+        self.assertSummariesMatch()
+
+        result = importers.import_rows(rows[:1], self.other)
+        self.assertEqual((result.imported_count, result.error_count), (0, 1))
+    def test_csv_import_unknown_lab_with_external_id(self):
+        keyed = IrisPlant.objects.create(created_by=self.user, external_id='A-1', **self.sample())
+        rows = [{
+            'sepal_length': '7', 'sepal_width': '3', 'petal_length': '6', 'petal_width': '2',
+            'species': 'virginica', 'lab_id': '999', 'external_id': 'A-1',
+        }]
+        result = importers.import_rows(rows, self.user)
+        self.assertEqual((result.imported_count, result.updated_count), (0, 0))
+        self.assertEqual(result.errors, [{'line': 2, 'error': 'lab_id: laboratory 999 does not exist'}])
+        keyed.refresh_from_db()
+        self.assertEqual(keyed.species, 'setosa')
+
+    def test_csv_import_sample_inserted_after_lookup(self):
+        rows = [
+            {'sepal_length': '5.1', 'sepal_width': '3.5', 'petal_length': '1.4', 'petal_width': '0.2',
+             'species': 'setosa', 'lab_id': str(self.labs[0].pk), 'external_id': 'R-1'},
+        ]
+        # Another user's import commits the same key right after the first lookup
+        IrisPlant.objects.create(created_by=self.other, external_id='R-1', **self.sample() | {'lab': self.labs[0]})
+        lookups = iter([lambda plants: {}, importers.find_existing])
+
+        with mock.patch.object(importers, 'find_existing', side_effect=lambda plants: next(lookups)(plants)):
+            result = importers.import_rows(rows, self.user, atomic=False)
+        self.assertEqual((result.imported_count, result.error_count), (0, 1))
+        self.assertEqual(result.errors[0]['error'], "external_id: 'R-1' is a sample of another user")
+        self.assertEqual(IrisPlant.objects.get(external_id='R-1').created_by, self.other)
+        self.assertSummariesMatch()
+
+    def test_duplicate_external_id_without_lab(self):
+        sample = self.sample() | {'external_id': 'Y', 'created_by': self.user.pk}
+        self.assertEqual(self.client.post('/api/iris/', sample, format='json').status_code, 201)
+        response = self.client.post('/api/iris/', sample, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('external_id', response.json())
+        # Same id in a laboratory is another key
+        response = self.client.post('/api/iris/', sample | {'lab': self.labs[0].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.patch(f"/api/iris/{response.json()['id']}/", {'lab': None}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        keyed = IrisPlant.objects.get(lab=self.labs[0], external_id='Y')
+        Group.objects.create(name='Editor').user_set.add(self.user)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('iris_update', args=[keyed.pk]), self.sample() | {'lab': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('lab', response.context['form'].errors)
+        keyed.refresh_from_db()
+        self.assertEqual(keyed.lab, self.labs[0])
+
+    def test_deleting_labs_with_the_same_external_id(self):
+        samples = [self.sample(lab=lab) | {'external_id': 'S1'} for lab in self.labs]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, samples + [self.sample() | {'external_id': 'S2'}], format='json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Laboratory.objects.filter(pk__in=[lab.pk for lab in self.labs]).delete()
+
+        self.assertEqual(IrisPlant.objects.count(), 3)
+        self.assertEqual(
+            sorted(IrisPlant.objects.values_list('external_id', flat=True), key=str), [None, None, 'S2']
+        )
+        self.assertSummariesMatch()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite connection tuning')
+class SQLiteTuningTests(TestCase):
+    """New SQLite connections get the configured PRAGMAs"""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('cache_size'), settings.IRIS_SQLITE_CACHE_SIZE)
+        self.assertEqual(self.pragma('busy_timeout'), settings.IRIS_SQLITE_BUSY_TIMEOUT)
+
+    @override_settings(IRIS_SQLITE_JOURNAL_MODE='wal; DROP TABLE iris_app_irisplant')
+    def test_invalid_settings_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            sqlite.get_pragmas()
+
+    @override_settings(IRIS_SQLITE_JOURNAL_MODE='')
+    def test_empty_journal_mode_keeps_the_file_mode(self):
+        self.assertNotIn('journal_mode', dict(sqlite.get_pragmas()))
+
+    def test_manage_py_does_not_modify_the_database_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'db.sqlite3'
+            environment = {key: value for key, value in os.environ.items() if not key.startswith('IRIS_SQLITE_')}
+            environment['IRIS_DB_PATH'] = str(path)
+            with closing(sqlite3.connect(path)) as database:
+                database.execute('CREATE TABLE sample (id INTEGER)')
+            content = path.read_bytes()
+            subprocess.run(
+                [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'showmigrations'],
+                env=environment, check=True, capture_output=True
+            )
+            self.assertEqual(path.read_bytes(), content)
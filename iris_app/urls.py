@@ -2,12 +2,13 @@ from django.urls import path, include
 from . import views
 from rest_framework.routers import DefaultRouter
 # BURAYI DÜZELTTİK: .viewsets (çoğul) yerine .viewset (tekil) yaptık
-from .viewset import IrisViewSet, LaboratoryViewSet 
+from .viewset import ImportJobViewSet, IrisViewSet, LaboratoryViewSet
 
 # REST API Router
 router = DefaultRouter()
 router.register(r'iris', IrisViewSet, basename='iris-api')
 router.register(r'laboratories', LaboratoryViewSet, basename='lab-api')
+router.register(r'import-jobs', ImportJobViewSet, basename='import-job-api')
 
 urlpatterns = [
     # Dashboard / Ana Sayfa
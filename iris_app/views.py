@@ -1,20 +1,21 @@
 import csv
-import numpy as np
+import io
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.urls import reverse
+from django.http import FileResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q
+from django.core.paginator import InvalidPage
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
 from .forms import IrisForm, RegisterForm, IrisSearchForm, IrisImportForm, IrisPredictionForm
-from .models import IrisPlant, Laboratory
-
-# ============= PERMISSION CHECK (HELPER) =============
-def is_editor_check(user):
-    """Check if user is Admin or in 'Editor' group"""
-    return user.is_superuser or user.groups.filter(name='Editor').exists()
+from .models import ImportJob, IrisPlant
+from .pagination import KeysetPaginator
+from .roles import editor_required
+from . import dataset_cache, exporters, importers, model_registry, prediction_cache, roles
 
 # ============= AUTHENTICATION VIEWS =============
 
@@ -70,18 +71,67 @@ def logout_view(request):
 
 # ============= DASHBOARD =============
 
+def get_total_count():
+    """
+    Total number of Iris samples for the dashboard.
+    Cached until the next write (at most IRIS_LIST_COUNT_CACHE_TIMEOUT
+    seconds); a timeout of 0 always runs an exact COUNT.
+    """
+    timeout = getattr(settings, 'IRIS_LIST_COUNT_CACHE_TIMEOUT', 3600)
+    if not timeout:
+        return IrisPlant.objects.count()
+    return dataset_cache.cached('total_count', IrisPlant.objects.count, timeout)
+
+
+# Columns the list templates show; everything else is deferred
+LIST_COLUMNS = (
+    'id', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width',
+    'species', 'created_at', 'lab__name',
+)
+
+
+def with_row_permissions(queryset, request):
+    """
+    Annotate can_edit on every row in SQL: editors may change their own
+    samples, superusers every sample, other users none
+    """
+    user = request.user
+    if not roles.get_roles(request).is_editor:
+        can_edit = Value(False)
+    elif user.is_superuser:
+        can_edit = Value(True)
+    else:
+        can_edit = ExpressionWrapper(Q(created_by_id=user.pk), output_field=BooleanField())
+    return queryset.annotate(can_edit=can_edit)
+
+
+def get_own_count(user):
+    """Number of samples created by a user, cached until the next write"""
+    return dataset_cache.cached(
+        f'own_count:{user.pk}', IrisPlant.objects.filter(created_by=user).count
+    )
+
+
 @login_required(login_url='login')
 def iris_list(request):
-    """Main Iris list page"""
-    samples = IrisPlant.objects.all().select_related('lab', 'created_by').order_by('-created_at')
+    """Main Iris list page (keyset paginated)"""
+    samples = IrisPlant.objects.select_related('lab').only(*LIST_COLUMNS)
+    paginator = KeysetPaginator(
+        with_row_permissions(samples, request),
+        getattr(settings, 'IRIS_LIST_PAGE_SIZE', 50)
+    )
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidPage:
+        return redirect('iris_list')
     
-    is_editor = is_editor_check(request.user)
-
+    # is_editor comes from the roles context processor
     context = {
-        'samples': samples,
-        'total_count': samples.count(),
+        'samples': page,
+        'page': page,
+        'total_count': get_total_count(),
+        'own_count': get_own_count(request.user),
         'species_types': dict(IrisPlant.SPECIES_CHOICES) if hasattr(IrisPlant, 'SPECIES_CHOICES') else {},
-        'is_editor': is_editor,
     }
     
     return render(request, 'iris_app/iris_list.html', context)
@@ -90,7 +140,7 @@ def iris_list(request):
 # ============= IRIS CRUD VIEWS =============
 
 @login_required(login_url='login')
-@user_passes_test(is_editor_check, login_url='login')
+@editor_required
 def iris_create(request):
     """Create new Iris record"""
     if request.method == "POST":
@@ -120,7 +170,7 @@ def iris_detail(request, pk):
     """View Iris details"""
     plant = get_object_or_404(IrisPlant, pk=pk)
     
-    is_editor = is_editor_check(request.user)
+    is_editor = roles.get_roles(request).is_editor
     
     context = {
         'plant': plant,
@@ -131,7 +181,7 @@ def iris_detail(request, pk):
 
 
 @login_required(login_url='login')
-@user_passes_test(is_editor_check, login_url='login')
+@editor_required
 def iris_update(request, pk):
     """Edit Iris record"""
     plant = get_object_or_404(IrisPlant, pk=pk)
@@ -162,7 +212,7 @@ def iris_update(request, pk):
 
 
 @login_required(login_url='login')
-@user_passes_test(is_editor_check, login_url='login')
+@editor_required
 def iris_delete(request, pk):
     """Delete Iris record"""
     plant = get_object_or_404(IrisPlant, pk=pk)
@@ -185,47 +235,33 @@ def iris_delete(request, pk):
 
 @login_required(login_url='login')
 def iris_search(request):
-    """Advanced search page - 3+ fields"""
-    form = IrisSearchForm(request.GET or None)
-    results = IrisPlant.objects.all().select_related('lab', 'created_by')
-    search_performed = False
+    """Advanced search page - 3+ fields (keyset paginated)"""
+    criteria = request.GET.copy()
+    after = criteria.pop('after', [None])[-1]
+    before = criteria.pop('before', [None])[-1]
     
-    if request.method == 'GET' and request.GET:
-        form = IrisSearchForm(request.GET)
-        if form.is_valid():
-            search_performed = True
-            
-            species = form.cleaned_data.get('species')
-            if species:
-                results = results.filter(species=species)
-            
-            min_sepal_length = form.cleaned_data.get('min_sepal_length')
-            if min_sepal_length is not None:
-                results = results.filter(sepal_length__gte=min_sepal_length)
-            
-            max_sepal_length = form.cleaned_data.get('max_sepal_length')
-            if max_sepal_length is not None:
-                results = results.filter(sepal_length__lte=max_sepal_length)
-            
-            min_petal_length = form.cleaned_data.get('min_petal_length')
-            if min_petal_length is not None:
-                results = results.filter(petal_length__gte=min_petal_length)
-            
-            max_petal_length = form.cleaned_data.get('max_petal_length')
-            if max_petal_length is not None:
-                results = results.filter(petal_length__lte=max_petal_length)
-            
-            lab = form.cleaned_data.get('lab')
-            if lab:
-                results = results.filter(lab=lab)
-    else:
-        form = IrisSearchForm()
+    form = IrisSearchForm(criteria or None)
+    search_performed = bool(criteria) and form.is_valid()
+    page = None
+    result_count = 0
+    if search_performed:
+        results = IrisPlant.objects.filter(form.get_filter())
+        samples = results.select_related('lab', 'created_by').only(*LIST_COLUMNS, 'created_by__username')
+        try:
+            page = KeysetPaginator(
+                with_row_permissions(samples, request), getattr(settings, 'IRIS_LIST_PAGE_SIZE', 50)
+            ).page(after=after, before=before)
+        except InvalidPage:
+            return redirect(f"{reverse('iris_search')}?{criteria.urlencode()}")
+        result_count = results.count()
     
     context = {
         'form': form,
-        'results': results,
-        'result_count': results.count(),
+        'results': page,
+        'page': page,
+        'result_count': result_count,
         'search_performed': search_performed,
+        'querystring': criteria.urlencode(),
     }
     
     return render(request, 'iris_app/search.html', context)
@@ -234,7 +270,7 @@ def iris_search(request):
 # ============= IMPORT/EXPORT VIEWS =============
 
 @login_required(login_url='login')
-@user_passes_test(is_editor_check, login_url='login')
+@editor_required
 def import_iris_csv(request):
     """Import Iris data from CSV file"""
     if request.method == "POST":
@@ -242,85 +278,107 @@ def import_iris_csv(request):
         if form.is_valid():
             csv_file = request.FILES['csv_file']
             
-            try:
-                decoded_file = csv_file.read().decode('utf-8').splitlines()
-                reader = csv.DictReader(decoded_file)
-                
-                imported_count = 0
-                error_count = 0
-                
-                species_codes = [code for code, name in IrisPlant.SPECIES_CHOICES]
-
-                for row in reader:
-                    try:
-                        species = row.get('species', '').lower().strip()
-                        
-                        if species not in species_codes:
-                            error_count += 1
-                            continue
-                        
-                        lab_id = row.get('lab_id')
-                        lab = None
-                        if lab_id:
-                            try:
-                                lab = Laboratory.objects.get(id=lab_id)
-                            except Laboratory.DoesNotExist:
-                                pass
-                        
-                        IrisPlant.objects.create(
-                            species=species,
-                            sepal_length=float(row.get('sepal_length', 0)),
-                            sepal_width=float(row.get('sepal_width', 0)),
-                            petal_length=float(row.get('petal_length', 0)),
-                            petal_width=float(row.get('petal_width', 0)),
-                            lab=lab,
-                            created_by=request.user
-                        )
-                        imported_count += 1
-                    except (ValueError, KeyError) as e:
-                        error_count += 1
-                        continue
-                
-                if imported_count > 0:
-                    messages.success(request, f'{imported_count} Iris samples imported successfully.')
-                if error_count > 0:
-                    messages.warning(request, f'{error_count} rows were skipped due to errors.')
-                
-                return redirect('iris_list')
+            threshold = getattr(settings, 'IRIS_IMPORT_BACKGROUND_THRESHOLD', 5 * 1024 * 1024)
+            if form.cleaned_data.get('background') or csv_file.size > threshold:
+                job = ImportJob.objects.create(
+                    csv_file=csv_file,
+                    file_name=csv_file.name,
+                    total_bytes=csv_file.size,
+                    created_by=request.user
+                )
+                messages.info(request, f'{csv_file.name} was queued for import.')
+                return redirect(f"{reverse('import_csv')}?job={job.pk}")
             
+            try:
+                result = importers.import_csv_file(csv_file, request.user)
             except Exception as e:
                 messages.error(request, f'Error processing file: {str(e)}')
+            else:
+                if result.imported_count > 0:
+                    messages.success(request, f'{result.imported_count} Iris samples imported successfully.')
+                if result.updated_count or result.unchanged_count:
+                    messages.info(
+                        request,
+                        f'{result.updated_count} existing samples updated, '
+                        f'{result.unchanged_count} unchanged (matched by external_id).'
+                    )
+                if result.error_count == 0:
+                    return redirect('iris_list')
+                
+                messages.warning(request, f'{result.error_count} rows were skipped due to errors.')
+                return render(request, 'iris_app/iris_import.html', {
+                    'form': IrisImportForm(),
+                    'import_result': result,
+                })
         else:
             messages.error(request, 'Please upload a valid CSV file.')
     else:
         form = IrisImportForm()
     
-    return render(request, 'iris_app/iris_import.html', {'form': form})
+    job = None
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        job = ImportJob.objects.filter(pk=job_id, created_by=request.user).first()
+    
+    return render(request, 'iris_app/iris_import.html', {'form': form, 'job': job})
 
 
-@login_required(login_url='login')
-def export_iris_csv(request):
-    """Export Iris data as CSV file"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = 'attachment; filename="iris_export.csv"'
-    response.write('\ufeff')
+EXPORT_COLUMNS = ['species', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'lab_id', 'date']
+
+
+def iter_export_csv(chunk_size):
+    """
+    Yield the CSV export in blocks of chunk_size rows.
+    Rows are read as plain tuples with a server-side iterator, so no
+    model instances are built and memory does not grow with the table.
+    """
+    species_names = dict(IrisPlant.SPECIES_CHOICES)
+    rows = IrisPlant.objects.values_list(
+        'species', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width',
+        'lab__name', 'created_at'
+    ).iterator(chunk_size=chunk_size)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
     
-    writer = csv.writer(response)
-    writer.writerow(['species', 'sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'lab_id', 'date'])    
-    for plant in IrisPlant.objects.all().select_related('lab'):
-        lab_name = plant.lab.name if plant.lab else "N/A"
-        species_display = plant.get_species_display()
-        
+    for count, (species, sepal_length, sepal_width, petal_length, petal_width, lab_name, created_at) in enumerate(rows, start=1):
         writer.writerow([
-            species_display,
-            plant.sepal_length,
-            plant.sepal_width,
-            plant.petal_length,
-            plant.petal_width,
-            lab_name,
-            plant.created_at.strftime('%Y-%m-%d %H:%M')
+            species_names.get(species, species),
+            sepal_length,
+            sepal_width,
+            petal_length,
+            petal_width,
+            lab_name or "N/A",
+            created_at.strftime('%Y-%m-%d %H:%M')
         ])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
     
+    yield buffer.getvalue()
+
+
+@login_required(login_url='login')
+def export_iris_csv(request):
+    """
+    Export Iris data as CSV file (streamed)
+    ?format=npz|parquet|arrow returns a columnar file instead
+    """
+    file_format = request.GET.get('format', 'csv')
+    if file_format != 'csv':
+        try:
+            output, content_type, extension = exporters.export_dataset(file_format)
+        except exporters.ExportFormatError as e:
+            messages.error(request, str(e))
+            return redirect('iris_list')
+        return FileResponse(output, as_attachment=True, filename=f'iris_export.{extension}', content_type=content_type)
+    
+    chunk_size = getattr(settings, 'IRIS_EXPORT_CHUNK_SIZE', 2000)
+    response = StreamingHttpResponse(iter_export_csv(chunk_size), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="iris_export.csv"'
     return response
 
 
@@ -329,12 +387,6 @@ def export_iris_csv(request):
 @login_required(login_url='login')
 def iris_predict(request):
     """Machine Learning prediction page - 3+ algorithms"""
-    from sklearn.linear_model import LogisticRegression
-    from sklearn.neighbors import KNeighborsClassifier
-    from sklearn.svm import SVC
-    from sklearn.datasets import load_iris
-    from sklearn.preprocessing import StandardScaler
-    
     prediction = None
     confidence = None
     algorithm_name = None
@@ -348,40 +400,17 @@ def iris_predict(request):
             petal_width = float(request.POST.get('petal_width', 0))
             algorithm = request.POST.get('algorithm', 'logistic')
             
-            # Load iris dataset
-            iris_data = load_iris()
-            X, y = iris_data.data, iris_data.target
-            
-            # Normalize data
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
-            
-            # Select algorithm
-            if algorithm == 'knn':
-                model = KNeighborsClassifier(n_neighbors=3)
-                algorithm_name = 'K-Nearest Neighbors (KNN)'
-            elif algorithm == 'svc':
-                model = SVC(probability=True, kernel='rbf')
-                algorithm_name = 'Support Vector Machine (SVM)'
-            else:
-                model = LogisticRegression(max_iter=200, random_state=42)
-                algorithm_name = 'Logistic Regression'
-            
-            # Train model
-            model.fit(X_scaled, y)
-            
-            # Make prediction
-            user_data = np.array([[sepal_length, sepal_width, petal_length, petal_width]])
-            user_data_scaled = scaler.transform(user_data)
+            # Make prediction with the pre-trained pipeline (cached per model version)
+            model, probabilities, _ = prediction_cache.predict(
+                algorithm, [sepal_length, sepal_width, petal_length, petal_width]
+            )
+            algorithm_name = model_registry.ALGORITHM_NAMES[model.algorithm]
             
-            prediction_idx = model.predict(user_data_scaled)[0]
-            prediction = iris_data.target_names[prediction_idx]
+            prediction_idx = max(range(len(probabilities)), key=probabilities.__getitem__)
+            prediction = model.classes[prediction_idx]
             
-            # Get confidence if available
-            if hasattr(model, 'predict_proba'):
-                prob = float(max(model.predict_proba(user_data_scaled)[0]))
-                confidence = int(round(prob * 100))
-                confidence = max(0, min(100, confidence))
+            confidence = int(round(probabilities[prediction_idx] * 100))
+            confidence = max(0, min(100, confidence))
             
         except ValueError:
             error_message = 'Please enter valid numbers for all measurement fields.'
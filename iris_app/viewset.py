@@ -1,10 +1,25 @@
-from rest_framework import viewsets, status, filters
+import json
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import viewsets, status, filters, serializers
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Avg, Min, Max, Count
-from .models import IrisPlant, Laboratory
-from .serializers import IrisPlantSerializer, LaboratorySerializer
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from .filters import FormFilterBackend
+from .forms import IrisSearchForm
+from .models import ImportJob, IrisPlant, Laboratory
+from .parsers import CSVSamplesParser, FEATURE_FIELDS
+from .serializers import (
+    ImportJobSerializer, IrisPlantBulkSerializer, IrisPlantSerializer, IrisPlantValuesSerializer, LaboratorySerializer
+)
+from .importers import find_existing, upsert_plants
+from .signals import TRACKED_FIELDS, apply_bulk_update_summaries, batched_summary_updates
+from . import dataset_cache, exporters, model_registry, prediction_cache, similarity
 
 
 class LaboratoryViewSet(viewsets.ModelViewSet):
@@ -32,23 +47,32 @@ class IrisViewSet(viewsets.ModelViewSet):
     Iris Plant REST API with advanced features
     
     Endpoints:
-    - GET /api/iris/ - List all iris samples
+    - GET /api/iris/ - List all iris samples (same filters as search/advanced,
+      ?fields=a,b,c and ?expand=lab_detail)
     - POST /api/iris/ - Create new iris sample
     - GET /api/iris/{id}/ - Get iris details
     - PUT /api/iris/{id}/ - Update iris sample
     - DELETE /api/iris/{id}/ - Delete iris sample
+    - POST/PATCH/DELETE /api/iris/bulk/ - Create, update or delete many samples
     - GET /api/iris/search/advanced/ - Advanced search with filters
     - GET /api/iris/statistics/list/ - Get statistics
-    - GET /api/iris/{id}/similar/ - Get similar samples
+    - GET /api/iris/{id}/similar/ - Get the nearest samples of a sample
+    - GET /api/iris/nearest/ - Get the nearest samples of given measurements
+    - POST /api/iris/nearest/batch/ - Nearest samples of many measurement vectors
+    - POST /api/iris/predict/batch/ - Predict species for many samples
+    - GET /api/iris/predict/cache/ - Prediction cache hit/miss counters
+    - GET /api/iris/export/{npz|parquet|arrow}/ - Columnar dataset export
     """
     
     queryset = IrisPlant.objects.all().select_related('lab', 'created_by')
     serializer_class = IrisPlantSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FormFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_form_class = IrisSearchForm
+    filter_form_actions = ('list', 'search_advanced')
     search_fields = ['species', 'lab__name', 'created_by__username']
     ordering_fields = ['created_at', 'sepal_length', 'petal_length', 'species']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def perform_create(self, serializer):
         """Automatically set created_by when creating new record"""
@@ -58,135 +82,200 @@ class IrisViewSet(viewsets.ModelViewSet):
         """Update record while keeping created_by unchanged"""
         serializer.save()
     
-    @action(detail=False, methods=['get'], url_path='search/advanced')
-    def search_advanced(self, request):
+    def list(self, request, *args, **kwargs):
         """
-        Advanced search with multiple filter criteria
+        List iris samples (supports ?fields= and ?expand=lab_detail)
+        Rows are serialized from .values() dicts, see IrisPlantValuesSerializer
         """
-        queryset = self.queryset
-        
-        # Species filter
-        species = request.query_params.get('species')
-        if species:
-            queryset = queryset.filter(species=species)
-        
-        # Sepal length range
-        min_sepal_length = request.query_params.get('min_sepal_length')
-        if min_sepal_length:
-            try:
-                queryset = queryset.filter(sepal_length__gte=float(min_sepal_length))
-            except (ValueError, TypeError):
-                pass
-        
-        max_sepal_length = request.query_params.get('max_sepal_length')
-        if max_sepal_length:
-            try:
-                queryset = queryset.filter(sepal_length__lte=float(max_sepal_length))
-            except (ValueError, TypeError):
-                pass
-        
-        # Sepal width range
-        min_sepal_width = request.query_params.get('min_sepal_width')
-        if min_sepal_width:
-            try:
-                queryset = queryset.filter(sepal_width__gte=float(min_sepal_width))
-            except (ValueError, TypeError):
-                pass
-        
-        max_sepal_width = request.query_params.get('max_sepal_width')
-        if max_sepal_width:
-            try:
-                queryset = queryset.filter(sepal_width__lte=float(max_sepal_width))
-            except (ValueError, TypeError):
-                pass
-        
-        # Petal length range
-        min_petal_length = request.query_params.get('min_petal_length')
-        if min_petal_length:
-            try:
-                queryset = queryset.filter(petal_length__gte=float(min_petal_length))
-            except (ValueError, TypeError):
-                pass
+        return self.list_values(self.filter_queryset(self.get_queryset()))
+    
+    def list_values(self, queryset):
+        """Paginated response of a queryset serialized with IrisPlantValuesSerializer"""
+        serializer = IrisPlantValuesSerializer(self.request, ordering=[*self.ordering_fields, 'id'])
+        rows = serializer.values_queryset(queryset)
+        page = self.paginate_queryset(rows)
+        data = [serializer.to_representation(row) for row in (page if page is not None else rows)]
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+    
+    @action(detail=False, methods=['post', 'patch', 'delete'], parser_classes=[JSONParser])
+    def bulk(self, request):
+        """
+        Create, update or delete many samples in one transaction
         
-        max_petal_length = request.query_params.get('max_petal_length')
-        if max_petal_length:
-            try:
-                queryset = queryset.filter(petal_length__lte=float(max_petal_length))
-            except (ValueError, TypeError):
-                pass
+        POST: [{"sepal_length": 5.1, ..., "species": "setosa", "lab": 1, "external_id": "A-17"}, ...]
+        (items with an external_id update the sample with the same lab and
+        external_id, so retrying a request is a no-op)
+        PATCH: [{"id": 7, "petal_width": 0.3}, ...] (only the given fields change)
+        DELETE: {"ids": [7, 8, 9]}
+        Lists may also be sent as {"samples": [...]}. Like the web views,
+        only the creator of a sample (or a superuser) may change it. Any
+        invalid item rejects the whole request with per-item errors
+        ({index: errors}); otherwise every item gets an {id, status} result
+        """
+        key = 'ids' if request.method == 'DELETE' else 'samples'
+        items = request.data.get(key) if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': f'Provide a non-empty list of {key}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Petal width range
-        min_petal_width = request.query_params.get('min_petal_width')
-        if min_petal_width:
-            try:
-                queryset = queryset.filter(petal_width__gte=float(min_petal_width))
-            except (ValueError, TypeError):
-                pass
+        max_items = getattr(settings, 'IRIS_BULK_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return Response(
+                {'error': f'Batch too large: at most {max_items} items per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        max_petal_width = request.query_params.get('max_petal_width')
-        if max_petal_width:
-            try:
-                queryset = queryset.filter(petal_width__lte=float(max_petal_width))
-            except (ValueError, TypeError):
-                pass
+        if request.method == 'POST':
+            return self.bulk_create(items)
+        if request.method == 'PATCH':
+            return self.bulk_update(items)
+        return self.bulk_destroy(items)
+    
+    def bulk_create(self, items):
+        """
+        Insert the validated items; items with an external_id upsert on
+        (lab, external_id), so a retried request changes nothing
+        """
+        serializer = IrisPlantBulkSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return _bulk_error_response(serializer.errors)
         
-        # Laboratory filter
-        lab_id = request.query_params.get('lab_id')
-        if lab_id:
-            queryset = queryset.filter(lab_id=lab_id)
+        plants = [IrisPlant(created_by=self.request.user, **item) for item in serializer.validated_data]
+        try:
+            with batched_summary_updates():
+                existing = find_existing(plants)
+                errors = {}
+                for index, plant in enumerate(plants):
+                    row = existing.get((plant.lab_id, plant.external_id)) if plant.external_id else None
+                    if row is not None and not self.may_change(row['created_by_id']):
+                        errors[index] = {'external_id': ['You do not have permission to edit this sample.']}
+                if errors:
+                    return _bulk_error_response(errors)
+                statuses = upsert_plants(plants, existing, getattr(settings, 'IRIS_BULK_BATCH_SIZE', 1000))
+        except IntegrityError:
+            return _external_id_conflict_response()
+        return Response({
+            'count': len(plants),
+            'results': [{'id': plant.pk, 'status': plant_status} for plant, plant_status in zip(plants, statuses)]
+        }, status=status.HTTP_201_CREATED if 'created' in statuses else status.HTTP_200_OK)
+    
+    def bulk_update(self, items):
+        """Apply the validated partial updates with bulk_update"""
+        serializer = IrisPlantBulkSerializer(data=items, many=True, partial=True)
+        if not serializer.is_valid():
+            return _bulk_error_response(serializer.errors)
         
-        # Creator user filter
-        created_by_id = request.query_params.get('created_by_id')
-        if created_by_id:
-            queryset = queryset.filter(created_by_id=created_by_id)
+        try:
+            with batched_summary_updates():
+                plants = IrisPlant.objects.select_for_update().in_bulk([item['id'] for item in serializer.validated_data])
+                errors = {}
+                for index, item in enumerate(serializer.validated_data):
+                    plant = plants.get(item['id'])
+                    if plant is None:
+                        errors[index] = {'id': ['Sample not found.']}
+                    elif not self.may_change(plant.created_by_id):
+                        errors[index] = {'id': ['You do not have permission to edit this sample.']}
+                if errors:
+                    return _bulk_error_response(errors)
+                
+                now = timezone.now()
+                changes, fields, results = [], set(), []
+                for item in serializer.validated_data:
+                    plant = plants[item['id']]
+                    previous = {field: getattr(plant, field) for field in TRACKED_FIELDS}
+                    changed = [name for name, value in item.items() if name != 'id' and _differs(plant, name, value)]
+                    for name in changed:
+                        setattr(plant, name, item[name])
+                    if changed:
+                        # bulk_update does not apply auto_now
+                        plant.updated_at = now
+                        changes.append((previous, plant))
+                        fields.update(changed)
+                    results.append({'id': plant.pk, 'status': 'updated' if changed else 'unchanged'})
+                
+                if changes:
+                    IrisPlant.objects.bulk_update(
+                        [plant for previous, plant in changes], [*sorted(fields), 'updated_at'],
+                        batch_size=getattr(settings, 'IRIS_BULK_BATCH_SIZE', 1000)
+                    )
+                    apply_bulk_update_summaries(changes)
+        except IntegrityError:
+            return _external_id_conflict_response()
+        return Response({'count': len(changes), 'results': results})
+    
+    def bulk_destroy(self, items):
+        """Delete the given ids with one filtered delete; unknown ids are reported as not_found"""
+        try:
+            ids = serializers.ListField(child=serializers.IntegerField()).run_validation(items)
+        except serializers.ValidationError as e:
+            return _bulk_error_response(e.detail)
         
-        serializer = self.get_serializer(queryset, many=True)
+        with batched_summary_updates():
+            owners = dict(IrisPlant.objects.filter(pk__in=ids).values_list('id', 'created_by_id'))
+            errors = {
+                index: {'id': ['You do not have permission to delete this sample.']}
+                for index, sample_id in enumerate(ids)
+                if sample_id in owners and not self.may_change(owners[sample_id])
+            }
+            if errors:
+                return _bulk_error_response(errors)
+            if owners:
+                IrisPlant.objects.filter(pk__in=owners).delete()
         return Response({
-            'count': queryset.count(),
-            'results': serializer.data
+            'count': len(owners),
+            'results': [
+                {'id': sample_id, 'status': 'deleted' if sample_id in owners else 'not_found'}
+                for sample_id in ids
+            ]
         })
     
+    def may_change(self, created_by_id):
+        """Ownership rule of the edit/delete views: the creator or a superuser"""
+        user = self.request.user
+        return user.is_superuser or created_by_id == user.pk
+    
+    @action(detail=False, methods=['get'], url_path='search/advanced')
+    def search_advanced(self, request):
+        """
+        Advanced search with multiple filter criteria
+        
+        Filters are defined by IrisSearchForm (species, min_/max_ of every
+        measurement, lab or lab_id, created_by or created_by_id); invalid
+        values return 400. Results are cursor paginated, ?fields= limits
+        the returned fields and ?count=true adds the total count
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        response = self.list_values(queryset)
+        if request.query_params.get('count', '').lower() in ('1', 'true', 'yes'):
+            response.data['count'] = queryset.count()
+        return response
+    
     @action(detail=False, methods=['get'], url_path='statistics')
     def statistics(self, request):
         """
         Get statistics about Iris samples
+        Answered from the IrisStatistics summary rows (no table scan),
+        including variance and standard deviation of every measurement.
+        Cached until the next write; supports If-None-Match (304)
         """
-        total_stats = IrisPlant.objects.aggregate(
-            total_samples=Count('id'),
-            avg_sepal_length=Avg('sepal_length'),
-            avg_sepal_width=Avg('sepal_width'),
-            avg_petal_length=Avg('petal_length'),
-            avg_petal_width=Avg('petal_width'),
-            min_sepal_length=Min('sepal_length'),
-            max_sepal_length=Max('sepal_length'),
-            min_sepal_width=Min('sepal_width'),
-            max_sepal_width=Max('sepal_width'),
-            min_petal_length=Min('petal_length'),
-            max_petal_length=Max('petal_length'),
-            min_petal_width=Min('petal_width'),
-            max_petal_width=Max('petal_width'),
-        )
-        
-        species_stats = IrisPlant.objects.values('species').annotate(
-            count=Count('id'),
-            avg_sepal_length=Avg('sepal_length'),
-            avg_petal_length=Avg('petal_length')
-        )
-        
-        lab_stats = IrisPlant.objects.values('lab__name').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        return Response({
-            'total_statistics': total_stats,
-            'species_distribution': list(species_stats),
-            'laboratory_distribution': list(lab_stats)
-        })
+        payload, etag = dataset_cache.get_statistics()
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(payload, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
     
     @action(detail=True, methods=['get'])
     def similar(self, request, pk=None):
         """
-        Get similar iris samples
+        Get the k nearest samples in measurement space
+        
+        Query parameters: k (default 10), metric (euclidean, manhattan,
+        chebyshev or cosine), species, lab (id, or "none" for samples
+        without a laboratory)
         """
         try:
             iris = self.get_object()
@@ -196,13 +285,277 @@ class IrisViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        similar = IrisPlant.objects.filter(
-            species=iris.species
-        ).exclude(id=iris.id)[:10]
+        try:
+            options = _similarity_options(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        index = similarity.get_index()
+        point = [getattr(iris, field) for field in FEATURE_FIELDS]
+        positions, distances = index.query([point], exclude_ids=[iris.id], **options)
+        ids = index.ids[positions[0]].tolist()
+        distances = distances[0].tolist()
+        samples = self.get_queryset().in_bulk(ids)
         
-        serializer = self.get_serializer(similar, many=True)
+        results = []
+        for sample_id, distance in zip(ids, distances):
+            if sample_id in samples:
+                data = self.get_serializer(samples[sample_id]).data
+                data['distance'] = distance
+                results.append(data)
         return Response({
             'reference_species': iris.get_species_display(),
-            'similar_count': len(similar),
-            'similar_samples': serializer.data
-        })
\ No newline at end of file
+            'metric': options['metric'],
+            'similar_count': len(results),
+            'similar_samples': results
+        })
+    
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """
+        Get the stored samples nearest to the given measurements
+        
+        Query parameters: sepal_length, sepal_width, petal_length,
+        petal_width, plus k, metric, species and lab as for similar/.
+        Answered from the in-memory index, without a database query.
+        """
+        try:
+            point = _feature_matrix([[request.query_params.get(field) for field in FEATURE_FIELDS]])
+            options = _similarity_options(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        neighbours = similarity.get_index().nearest(point, **options)[0]
+        return Response({
+            'query': dict(zip(FEATURE_FIELDS, point[0].tolist())),
+            'metric': options['metric'],
+            'count': len(neighbours),
+            'neighbours': neighbours
+        })
+    
+    @action(detail=False, methods=['post'], url_path='nearest/batch',
+            parser_classes=[JSONParser, CSVSamplesParser])
+    def nearest_batch(self, request):
+        """
+        Get the nearest stored samples of many query vectors at once
+        
+        JSON body: {"samples": [[5.1, 3.5, 1.4, 0.2], ...], "k": 5, "metric": "euclidean"}
+        (samples may also be objects; species and lab filters are optional)
+        CSV body (text/csv): one query vector per line, options as query parameters
+        """
+        data = request.data if isinstance(request.data, dict) else {'samples': request.data}
+        samples = data.get('samples')
+        if not isinstance(samples, list) or not samples:
+            return Response(
+                {'error': 'Provide a non-empty list of samples.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_batch = getattr(settings, 'IRIS_NEAREST_MAX_BATCH', 10000)
+        if len(samples) > max_batch:
+            return Response(
+                {'error': f'Batch too large: at most {max_batch} samples per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        params = request.query_params.dict()
+        params.update({
+            key: str(data[key]) for key in ('k', 'metric', 'species', 'lab')
+            if data.get(key) is not None
+        })
+        try:
+            points = _feature_matrix(samples)
+            options = _similarity_options(params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        neighbours = similarity.get_index().nearest(points, **options)
+        return Response({
+            'metric': options['metric'],
+            'count': len(points),
+            'results': [{'neighbours': row} for row in neighbours]
+        })
+    
+    @action(detail=False, methods=['post'], url_path='predict/batch',
+            parser_classes=[JSONParser, CSVSamplesParser])
+    def predict_batch(self, request):
+        """
+        Predict species for many samples with one vectorized model call
+        
+        JSON body: {"algorithm": "knn", "samples": [[5.1, 3.5, 1.4, 0.2], ...]}
+        (samples may also be objects with sepal_length, sepal_width, ... keys)
+        CSV body (text/csv): one sample per line, algorithm as ?algorithm=
+        """
+        data = request.data if isinstance(request.data, dict) else {'samples': request.data}
+        algorithm = data.get('algorithm') or request.query_params.get('algorithm', model_registry.DEFAULT_ALGORITHM)
+        if not isinstance(algorithm, str) or algorithm not in model_registry.ALGORITHM_NAMES:
+            return Response(
+                {'error': f'Unknown algorithm. Choose one of: {", ".join(model_registry.ALGORITHM_NAMES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        samples = data.get('samples')
+        if not isinstance(samples, list) or not samples:
+            return Response(
+                {'error': 'Provide a non-empty list of samples.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_batch = getattr(settings, 'IRIS_PREDICT_MAX_BATCH', 100000)
+        if len(samples) > max_batch:
+            return Response(
+                {'error': f'Batch too large: at most {max_batch} samples per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            features = _feature_matrix(samples)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        model, probabilities = model_registry.predict_proba(algorithm, features)
+        header = {
+            'algorithm': model.algorithm,
+            'algorithm_name': model_registry.ALGORITHM_NAMES[model.algorithm],
+            'model_version': model.version,
+            'classes': model.classes,
+            'count': len(features),
+        }
+        
+        chunk_size = getattr(settings, 'IRIS_PREDICT_CHUNK_SIZE', 5000)
+        if len(features) <= chunk_size:
+            return Response({**header, 'results': _prediction_results(model.classes, probabilities)})
+        
+        # Large batches are streamed so the client starts receiving results immediately
+        return StreamingHttpResponse(
+            _stream_predictions(header, model.classes, probabilities, chunk_size),
+            content_type='application/json'
+        )
+    
+    @action(detail=False, methods=['get'], url_path='predict/cache')
+    def predict_cache(self, request):
+        """
+        Get hit/miss counters of the prediction result cache
+        """
+        return Response(prediction_cache.get_stats())
+    
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<file_format>[a-z]+)')
+    def export(self, request, file_format=None):
+        """
+        Export the whole dataset as npz (NumPy), parquet or arrow (pyarrow)
+        """
+        try:
+            output, content_type, extension = exporters.export_dataset(file_format)
+        except exporters.ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return FileResponse(output, as_attachment=True, filename=f'iris_export.{extension}', content_type=content_type)
+
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Background CSV import jobs (read-only, for progress polling)
+    
+    Endpoints:
+    - GET /api/import-jobs/ - List your import jobs
+    - GET /api/import-jobs/{id}/ - Get progress of an import job
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        """Users only see their own jobs, admins see all"""
+        queryset = ImportJob.objects.all()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+
+def _prediction_results(classes, probabilities):
+    """Build the per-sample result dicts for a probability matrix"""
+    species = [classes[index] for index in probabilities.argmax(axis=1)]
+    return [
+        {'species': name, 'probabilities': dict(zip(classes, row))}
+        for name, row in zip(species, probabilities.round(6).tolist())
+    ]
+
+
+def _stream_predictions(header, classes, probabilities, chunk_size):
+    """Yield the batch prediction response as JSON, chunk by chunk"""
+    yield json.dumps(header)[:-1] + ', "results": ['
+    for start in range(0, len(probabilities), chunk_size):
+        results = _prediction_results(classes, probabilities[start:start + chunk_size])
+        body = json.dumps(results)[1:-1]
+        yield body if start == 0 else ', ' + body
+    yield ']}'
+
+
+def _bulk_error_response(errors):
+    """400 response of a rejected bulk request with its per-item errors"""
+    return Response(
+        {'error': 'Invalid items, nothing was saved.', 'errors': errors},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _external_id_conflict_response():
+    """400 response of a bulk write that broke the external_id uniqueness"""
+    return Response(
+        {'error': 'external_id must be unique per laboratory, nothing was saved.'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _differs(plant, name, value):
+    """Whether a bulk item value changes a sample (lab compared by id, without a query)"""
+    if name == 'lab':
+        return plant.lab_id != (value.pk if value is not None else None)
+    return getattr(plant, name) != value
+
+
+def _feature_matrix(samples):
+    """
+    Convert a list of samples (4 values each, or dicts with the feature
+    names) into a float64 matrix; raises ValueError for invalid input
+    """
+    import numpy as np
+    
+    message = f'Each sample needs 4 numeric values: {", ".join(FEATURE_FIELDS)}.'
+    try:
+        if isinstance(samples[0], dict):
+            samples = [[sample[field] for field in FEATURE_FIELDS] for sample in samples]
+        features = np.array(samples, dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(message)
+    if features.ndim != 2 or features.shape[1] != len(FEATURE_FIELDS) or not np.isfinite(features).all():
+        raise ValueError(message)
+    return features
+
+
+def _similarity_options(params):
+    """Parse the k, metric, species and lab query parameters of a similarity search"""
+    try:
+        k = int(params.get('k', 10))
+    except ValueError:
+        raise ValueError('k must be an integer')
+    max_k = getattr(settings, 'IRIS_SIMILAR_MAX_K', 100)
+    if not 1 <= k <= max_k:
+        raise ValueError(f'k must be between 1 and {max_k}')
+
+    metric = params.get('metric', similarity.DEFAULT_METRIC)
+    if metric not in similarity.METRICS:
+        raise ValueError(f"Unknown metric. Choose from: {', '.join(similarity.METRICS)}")
+
+    species = params.get('species') or None
+    if species is not None and species not in similarity.SPECIES_CODES:
+        raise ValueError(f"Unknown species. Choose from: {', '.join(similarity.SPECIES_CODES)}")
+
+    lab_id = params.get('lab') or None
+    if lab_id is not None:
+        if lab_id.lower() == 'none':
+            lab_id = 0
+        else:
+            try:
+                lab_id = int(lab_id)
+            except ValueError:
+                raise ValueError('lab must be a laboratory id or "none"')
+    return {'k': k, 'metric': metric, 'species': species, 'lab_id': lab_id}
@@ -56,6 +56,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'iris_app.context_processors.roles',
             ],
         },
     },
@@ -67,10 +68,37 @@ WSGI_APPLICATION = 'iris_config.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('IRIS_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections (and their page cache) between requests
+        'CONN_MAX_AGE': int(os.environ.get('IRIS_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Writers take the write lock when the transaction starts, so two
+            # transactions never deadlock upgrading a read lock (busy_timeout
+            # cannot resolve that and one of them fails with "database is locked")
+            'transaction_mode': os.environ.get('IRIS_SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+        },
     }
 }
 
+# ============= SQLITE =============
+# PRAGMAs applied to every new SQLite connection (iris_app/sqlite.py).
+# WAL lets readers run while an import writes; synchronous=NORMAL is
+# durable against application crashes in WAL mode (a power loss may drop
+# the last commits). Set IRIS_SQLITE_JOURNAL_MODE=delete and
+# IRIS_SQLITE_SYNCHRONOUS=full to get the SQLite defaults back.
+# The journal mode is stored in the database file, and db.sqlite3 is
+# tracked in the repository, so manage.py (runserver, migrate, tests, the
+# import worker) sets an empty IRIS_SQLITE_JOURNAL_MODE: it keeps the mode
+# the file has. The WSGI/ASGI servers switch the file to WAL, which the
+# management commands then keep using. Export IRIS_SQLITE_JOURNAL_MODE=wal
+# to switch from manage.py.
+IRIS_SQLITE_JOURNAL_MODE = os.environ.get('IRIS_SQLITE_JOURNAL_MODE', 'wal')
+IRIS_SQLITE_SYNCHRONOUS = os.environ.get('IRIS_SQLITE_SYNCHRONOUS', 'normal')
+IRIS_SQLITE_CACHE_SIZE = int(os.environ.get('IRIS_SQLITE_CACHE_SIZE', -64000))  # negative = KiB per connection (64 MB)
+IRIS_SQLITE_MMAP_SIZE = int(os.environ.get('IRIS_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes, 0 = off
+IRIS_SQLITE_BUSY_TIMEOUT = int(os.environ.get('IRIS_SQLITE_BUSY_TIMEOUT', 5000))  # ms to wait for a lock
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,7 +149,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'iris_app.pagination.CreatedAtCursorPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
@@ -129,6 +157,91 @@ REST_FRAMEWORK = {
     ],
 }
 
+# ============= MACHINE LEARNING =============
+# Trained prediction models (scaler + estimator pipelines) are stored here.
+# Run `python manage.py train_iris_models` to (re)publish them.
+IRIS_MODEL_DIR = BASE_DIR / 'ml_models'
+# Models are trained on the IrisPlant table once it has this many labelled
+# samples covering every species; until then the bundled UCI dataset is used.
+IRIS_MODEL_MIN_SAMPLES = 30
+# Preload scikit-learn and the published models at startup (IrisAppConfig.ready).
+# Enable it for servers that fork workers after loading the app
+# (gunicorn --preload) so the workers share the memory copy-on-write.
+# When disabled every ML import stays lazy until the first prediction.
+IRIS_ML_WARMUP = os.environ.get('IRIS_ML_WARMUP', '0').lower() in ('1', 'true', 'yes')
+# Batch prediction API: maximum samples per request, and batches larger
+# than the chunk size are streamed back chunk by chunk.
+IRIS_PREDICT_MAX_BATCH = 100000
+IRIS_PREDICT_CHUNK_SIZE = 5000
+# Nearest-neighbour search (similar/, nearest/): largest k allowed and
+# maximum query vectors per nearest/batch/ request
+IRIS_SIMILAR_MAX_K = 100
+IRIS_NEAREST_MAX_BATCH = 10000
+# Seconds after which the in-memory similarity index re-checks the database
+# even if the dataset generation did not change. The generation lives in
+# the default cache, which is per process with locmem, so this bounds how
+# stale the index of one worker can be after writes made by another.
+# 0 = check on every query
+IRIS_SIMILARITY_RESYNC_INTERVAL = 60
+# Bulk write API (bulk/): maximum items per request, and rows written per
+# bulk_create / bulk_update statement
+IRIS_BULK_MAX_ITEMS = 10000
+IRIS_BULK_BATCH_SIZE = 1000
+
+# ============= DASHBOARD =============
+IRIS_LIST_PAGE_SIZE = 50
+IRIS_LIST_COUNT_CACHE_TIMEOUT = 3600  # max seconds the total count is cached (until the next write), 0 = exact count
+
+# ============= CSV IMPORT =============
+IRIS_IMPORT_BATCH_SIZE = 1000  # rows validated and bulk-inserted per chunk
+IRIS_IMPORT_MAX_REPORTED_ERRORS = 500  # row errors listed in the import report
+# Uploads are streamed (large files are spooled to a temporary file by Django
+# and decoded chunk by chunk), so the limit is not bound by worker memory.
+IRIS_IMPORT_MAX_UPLOAD_SIZE = int(os.environ.get('IRIS_IMPORT_MAX_UPLOAD_SIZE', 500 * 1024 * 1024))
+# Larger files become ImportJobs, processed by `python manage.py run_import_worker`
+IRIS_IMPORT_BACKGROUND_THRESHOLD = 5 * 1024 * 1024
+# A running job without progress for this many seconds is claimed again by
+# the worker and resumes after its last committed chunk
+IRIS_IMPORT_STALE_AFTER = 600
+
+# ============= CSV EXPORT =============
+IRIS_EXPORT_CHUNK_SIZE = 2000  # rows fetched and sent per streamed chunk
+
+# ============= CACHE =============
+# Both caches default to per-process local memory. Point them at a shared
+# backend in production (with several workers the dataset generation and
+# role version counters must be shared, or other workers serve counts until
+# the timeout and keep revoked Editor rights until IRIS_ROLES_SESSION_TTL), e.g.
+#   IRIS_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   IRIS_CACHE_LOCATION=/var/tmp/iris_cache
+#   IRIS_PREDICTION_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   IRIS_PREDICTION_CACHE_LOCATION=/var/tmp/iris_predictions
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('IRIS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('IRIS_CACHE_LOCATION', ''),
+    },
+    'predictions': {
+        'BACKEND': os.environ.get(
+            'IRIS_PREDICTION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('IRIS_PREDICTION_CACHE_LOCATION', 'iris-predictions'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+IRIS_PREDICTION_CACHE = 'predictions'
+IRIS_PREDICTION_CACHE_STEP = 0.1  # cm, matches the step of the form widgets
+IRIS_PREDICTION_CACHE_TIMEOUT = 3600
+# Statistics and dashboard counts, invalidated by a generation counter on every write
+IRIS_DATASET_CACHE = 'default'
+IRIS_DATASET_CACHE_TIMEOUT = 3600
+# Max seconds the Editor flag cached in a session is trusted before group
+# membership is read again. Role versions make changes visible at once
+# when the default cache is shared; this bounds the delay when it is not.
+IRIS_ROLES_SESSION_TTL = 300
+
 # ============= CSRF AYARLARI =============
 CSRF_TRUSTED_ORIGINS = []
 
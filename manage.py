@@ -7,6 +7,9 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iris_config.settings')
+    # Keep the journal mode stored in the database file: switching to WAL
+    # rewrites the header of the db.sqlite3 in the repository
+    os.environ.setdefault('IRIS_SQLITE_JOURNAL_MODE', '')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: